@@ -1,19 +1,118 @@
+import io
 import os
+import json
+import argparse
+import warnings
+import sys
 import math
+import codecs
 import numpy as np
+from functools import lru_cache, partial
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple
 from numpy.typing import ArrayLike, NDArray
-from typing import Tuple, Optional
-import matplotlib.pyplot as plt
+from typing import Tuple, Optional, IO, NamedTuple, Iterator
 
+# strategies for reducing a series to a few samples per canvas column
+DECIMATION_STRATEGIES: Tuple = ('auto', 'none', 'minmax', 'minmax_ends')
+# 'auto' decimates once there are more samples than this many per column
+DECIMATION_FACTOR: int = 4
+# number of samples binned at once, bounds the size of float temporaries
+CHUNK_SIZE: int = 1 << 20
 
-def print_chart(canvas: NDArray) -> None:
+# canvases are uint8 arrays, ASCII characters are stored as themselves and
+# any other character gets a code from 128 upwards in this palette
+_PALETTE: list = ['·']
+_PALETTE_CODES: dict = {'·': 128}
+
+
+def glyph(char: str) -> int:
+    """
+    Get the canvas byte code of a character, adding it to the palette if needed.
+    :param char:
+    :return:
+
+    >>> glyph('+'), glyph('·')
+    (43, 128)
+    """
+    code = ord(char)
+    if code < 128:
+        return code
+    if char not in _PALETTE_CODES:
+        if len(_PALETTE) == 128:
+            raise ValueError(f"no canvas code left for {char!r}")
+        _PALETTE_CODES[char] = 128 + len(_PALETTE)
+        _PALETTE.append(char)
+    return _PALETTE_CODES[char]
+
+
+def encode_text(text: str) -> NDArray:
+    """
+    Encode a string into canvas byte codes.
+    :param text:
+    :return:
+    """
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    return np.array([glyph(char) for char in text], dtype=np.uint8)
+
+
+@lru_cache(maxsize=None)
+def _decoding_table(palette_size: int) -> str:
+    """
+    Byte code to character table for codecs.charmap_decode.
+    :param palette_size:
+    :return:
+    """
+    ascii_chars = ''.join(map(chr, range(128)))
+    return ascii_chars + ''.join(_PALETTE[:palette_size]).ljust(128, '?')
+
+
+def decode_text(codes: NDArray) -> str:
+    """
+    Decode canvas byte codes back into a string in one pass.
+    :param codes:
+    :return:
+    """
+    table = _decoding_table(len(_PALETTE))
+    return codecs.charmap_decode(np.ascontiguousarray(codes), 'strict', table)[0]
+
+
+def render_chart(canvas: NDArray) -> str:
+    """
+    Turn a canvas into text, one line per row.
+    :param canvas:
+    :return:
+    """
+    lines = np.empty((canvas.shape[0], canvas.shape[1] + 1), dtype=np.uint8)
+    lines[:, :-1] = canvas
+    lines[:, -1] = ord('\n')
+    return decode_text(lines)
+
+
+def print_chart(canvas: NDArray, out: Optional[IO] = None) -> None:
     """
     Print a multidimensional array to the standard output
     :param canvas:
+    :param out: text or binary file, defaults to the standard output
     :return:
     """
-    canvas_inter = [''.join(row) for row in canvas]
-    print('\n'.join(canvas_inter))
+    _write_text(render_chart(canvas), out)
+
+
+def _write_text(text: str, out: Optional[IO] = None) -> None:
+    """
+    Write text to a text or binary file with a single call.
+    :param text:
+    :param out: defaults to the standard output
+    :return:
+    """
+    out = sys.stdout if out is None else out
+    if isinstance(out, (io.RawIOBase, io.BufferedIOBase)):
+        out.write(text.encode('utf-8'))
+    else:
+        out.write(text)
 
 
 def initialize_canvas(
@@ -28,24 +127,27 @@ def initialize_canvas(
     :param grid:
     :return:
 
-    >>> initialize_canvas(2, 2).tolist()
-    [['+', '+'], ['+', '+']]
-    >>> initialize_canvas(5, 3, True).tolist()
-    [['+', '-', '-', '-', '+'], ['|', '·', '·', '·', '|'], ['+', '-', '-', '-', '+']]
+    >>> render_chart(initialize_canvas(2, 2)).splitlines()
+    ['++', '++']
+    >>> print_chart(initialize_canvas(5, 3, True))
+    +---+
+    |···|
+    +---+
     """
-    # initialize corr 2D array with space char
-    canvas = np.empty((height, width), dtype="str")
+    # initialize corr 2D array with space char, one byte per cell
+    canvas = np.frombuffer(bytearray(height * width), dtype=np.uint8)
+    canvas = canvas.reshape(height, width)
     if grid:
-        canvas[:] = '·'
+        canvas[:] = glyph('·')
     else:
-        canvas[:] = ' '
+        canvas[:] = glyph(' ')
 
     # fill corners
-    canvas[[0, 0, -1, -1], [0, -1, 0, -1]] = '+'
+    canvas[[0, 0, -1, -1], [0, -1, 0, -1]] = glyph('+')
 
     # fill edges, horizontal and then vertical
-    canvas[0, 1:-1] = canvas[-1, 1:-1] = '-'
-    canvas[1:-1, 0] = canvas[1:-1, -1] = '|'
+    canvas[0, 1:-1] = canvas[-1, 1:-1] = glyph('-')
+    canvas[1:-1, 0] = canvas[1:-1, -1] = glyph('|')
     return canvas
 
 
@@ -53,12 +155,14 @@ def preprocess_data(
     x: ArrayLike,
     y: ArrayLike,
     canvas: NDArray,
+    decimation: str = 'none',
 ) -> Tuple:
     """
     Min-max normalize each axis and scale it to width and height of the canvas
     :param x:
     :param y:
     :param canvas:
+    :param decimation: one of DECIMATION_STRATEGIES, see `decimate`
     :return:
 
     >>> width, height = 5, 5
@@ -79,16 +183,237 @@ def preprocess_data(
 
     height, width = canvas.shape
     x, y = np.asarray(x), np.asarray(y)
+    if decimation == 'auto':
+        decimation = 'minmax' if len(x) > DECIMATION_FACTOR * width else 'none'
+    if decimation != 'none':
+        x_pre, y = decimate(x, y, width, decimation)
+        return x_pre, _rescale(_min_max_normalize(y), height).astype(int)
+
     x_pre = _rescale(_min_max_normalize(x), width).astype(int)
     y_pre = _rescale(_min_max_normalize(y), height).astype(int)
     return x_pre, y_pre
 
 
+def _to_cells(arr: NDArray, lo: ArrayLike, hi: ArrayLike, size: int) -> NDArray:
+    """
+    Map values in [lo, hi] to cell indices 0..size-1, like preprocess_data.
+    lo and hi may also be arrays with one limit per value.
+    :param arr:
+    :param lo:
+    :param hi:
+    :param size:
+    :return:
+    """
+    span = np.subtract(hi, lo)
+    span = np.where(span == 0, 1, span)
+    return np.floor((arr - lo) / span * (size - 1)).astype(int)
+
+
+# number of samples and extent of a series, see `scan_limits`
+Limits: NamedTuple = namedtuple('Limits', 'count x_min x_max y_min y_max')
+
+
+def array_chunks(
+    x: ArrayLike,
+    y: ArrayLike,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Tuple[NDArray, NDArray]]:
+    """
+    Iterate over in-memory x and y in chunks.
+    :param x:
+    :param y:
+    :param chunk_size:
+    :return:
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    assert len(x) == len(y)
+    for start in range(0, len(x), chunk_size):
+        yield x[start:start + chunk_size], y[start:start + chunk_size]
+
+
+def _split_columns(table: NDArray, offset: int) -> Tuple[NDArray, NDArray]:
+    """
+    Split a chunk of rows into x and y. A single column is y, indexed by row.
+    :param table:
+    :param offset: index of the first row of the chunk
+    :return:
+    """
+    if table.ndim == 1 or table.shape[1] == 1:
+        y = table.reshape(-1)
+        return np.arange(offset, offset + len(y)), y
+    return table[:, 0], table[:, 1]
+
+
+def _csv_chunks(path: str, chunk_size: int) -> Iterator[Tuple[NDArray, NDArray]]:
+    """
+    Read a CSV file `chunk_size` rows at a time, skipping a header line.
+    :param path:
+    :param chunk_size:
+    :return:
+    """
+    with open(path) as f:
+        first = f.readline()
+        try:
+            float(first.split(',')[0])
+            lines = [first]
+        except ValueError:
+            lines = []
+        offset = 0
+        while True:
+            lines += islice(f, chunk_size - len(lines))
+            if not lines:
+                break
+            table = np.loadtxt(lines, delimiter=',', ndmin=2)
+            yield _split_columns(table, offset)
+            offset += len(table)
+            lines = []
+
+
+def iter_source(source, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[NDArray, NDArray]]:
+    """
+    Iterate over a series that doesn't fit in memory, in (x, y) chunks.
+    A .npy file is memory-mapped, any other path is read as CSV. Both hold
+    either one column of y values or x and y in the first two columns.
+    A callable is called to get a fresh iterator of (x, y) chunks, so that
+    it can be read more than once.
+    :param source: a file path, or a callable returning an iterator of (x, y)
+    :param chunk_size:
+    :return:
+    """
+    if callable(source):
+        yield from source()
+        return
+    if hasattr(source, '__next__'):
+        raise TypeError("a one-shot iterator can't be read twice, pass a callable returning it")
+
+    path = os.fspath(source)
+    if not path.endswith('.npy'):
+        yield from _csv_chunks(path, chunk_size)
+        return
+    table = np.load(path, mmap_mode='r')
+    for start in range(0, len(table), chunk_size):
+        yield _split_columns(table[start:start + chunk_size], start)
+
+
+def scan_limits(chunks: Iterator[Tuple[NDArray, NDArray]]) -> Limits:
+    """
+    Count the samples of a series and find its extent in one pass.
+    :param chunks: (x, y) chunks
+    :return:
+
+    >>> scan_limits(array_chunks([3, 1, 2], [5, 7, 6], chunk_size=2))
+    Limits(count=3, x_min=1, x_max=3, y_min=5, y_max=7)
+    """
+    count, x_min, x_max, y_min, y_max = 0, math.inf, -math.inf, math.inf, -math.inf
+    for x, y in chunks:
+        if len(x) == 0:
+            continue
+        count += len(x)
+        x_min, x_max = min(x_min, np.amin(x).item()), max(x_max, np.amax(x).item())
+        y_min, y_max = min(y_min, np.amin(y).item()), max(y_max, np.amax(y).item())
+    return Limits(count, x_min, x_max, y_min, y_max)
+
+
+def decimate(
+    x: ArrayLike,
+    y: ArrayLike,
+    width: int,
+    strategy: str = 'minmax',
+) -> Tuple[NDArray, NDArray]:
+    """
+    Reduce a series to the extreme samples of every canvas column, so the
+    cost of drawing depends on the canvas width and not on the data length.
+    'minmax' keeps the lowest and highest y of each column, 'minmax_ends'
+    also keeps the first and last sample of each column.
+    :param x:
+    :param y:
+    :param width:
+    :param strategy:
+    :return: the canvas column and the y value of every kept sample
+
+    >>> cols, ys = decimate([0, 1, 2, 3, 4, 5], [5, 1, 3, 9, 2, 4], 3)
+    >>> cols.tolist(), ys.tolist()
+    ([0, 0, 1, 1, 2, 2], [1.0, 5.0, 2.0, 9.0, 4.0, 4.0])
+    """
+    assert strategy in ('minmax', 'minmax_ends')
+    limits = scan_limits(array_chunks(x, y))
+    return decimate_chunks(array_chunks(x, y), limits, width, strategy)
+
+
+def decimate_chunks(
+    chunks: Iterator[Tuple[NDArray, NDArray]],
+    limits: Limits,
+    width: int,
+    strategy: str = 'minmax',
+) -> Tuple[NDArray, NDArray]:
+    """
+    Decimate a series given as (x, y) chunks in a single binning pass,
+    see `decimate`.
+    :param chunks:
+    :param limits: the limits of the whole series
+    :param width:
+    :param strategy:
+    :return:
+    """
+    ends = strategy == 'minmax_ends'
+    y_lo = np.full(width, np.inf)
+    y_hi = np.full(width, -np.inf)
+    first = np.zeros(width)
+    last = np.zeros(width)
+    seen = np.zeros(width, dtype=bool)
+    for x_chunk, y_chunk in chunks:
+        if len(x_chunk) == 0:
+            continue
+        y_chunk = np.asarray(y_chunk, dtype=float)
+        cols = _to_cells(x_chunk, limits.x_min, limits.x_max, width)
+        if np.all(cols[1:] >= cols[:-1]):
+            # sorted x: reduce the runs of equal columns
+            bounds = np.flatnonzero(np.diff(cols)) + 1
+            run_start = np.concatenate(([0], bounds))
+            run_end = np.concatenate((bounds, [len(cols)])) - 1
+            used = cols[run_start]
+            lo = np.minimum.reduceat(y_chunk, run_start)
+            hi = np.maximum.reduceat(y_chunk, run_start)
+            if ends:
+                chunk_first, chunk_last = y_chunk[run_start], y_chunk[run_end]
+        else:
+            lo = np.full(width, np.inf)
+            hi = np.full(width, -np.inf)
+            np.minimum.at(lo, cols, y_chunk)
+            np.maximum.at(hi, cols, y_chunk)
+            used = np.flatnonzero(lo <= hi)
+            lo, hi = lo[used], hi[used]
+            if ends:
+                idx = np.arange(len(cols))
+                first_idx = np.full(width, len(cols))
+                last_idx = np.full(width, -1)
+                np.minimum.at(first_idx, cols, idx)
+                np.maximum.at(last_idx, cols, idx)
+                chunk_first, chunk_last = y_chunk[first_idx[used]], y_chunk[last_idx[used]]
+
+        y_lo[used] = np.minimum(y_lo[used], lo)
+        y_hi[used] = np.maximum(y_hi[used], hi)
+        if ends:
+            # chunks come in order, so only a column's first chunk sets its first sample
+            new = ~seen[used]
+            first[used[new]] = chunk_first[new]
+            last[used] = chunk_last
+        seen[used] = True
+
+    filled = np.flatnonzero(seen)
+    kept = [y_lo[filled], y_hi[filled]]
+    if ends:
+        kept += [first[filled], last[filled]]
+    cols = np.repeat(filled, len(kept))
+    return cols, np.stack(kept, axis=1).ravel()
+
+
 def draw_points(
     x: ArrayLike,
     y: ArrayLike,
     canvas: NDArray,
     grid: bool,
+    decimation: str = 'none',
 ) -> NDArray:
     """
     Draw the data points on a canvas.
@@ -96,14 +421,15 @@ def draw_points(
     :param y:
     :param canvas:
     :param grid:
+    :param decimation: one of DECIMATION_STRATEGIES, see `decimate`
     :return:
     """
     assert len(x) == len(y)
-    x_pre, y_pre = preprocess_data(x, y, canvas)
+    x_pre, y_pre = preprocess_data(x, y, canvas, decimation)
     if grid:
-        canvas[y_pre, x_pre] = '*'
+        canvas[y_pre, x_pre] = glyph('*')
     else:
-        canvas[y_pre, x_pre] = '·'
+        canvas[y_pre, x_pre] = glyph('·')
     return np.flip(canvas, axis=0)
 
 
@@ -125,36 +451,107 @@ def label_axis(
     :param legend:
     :return:
     """
-    # create x-axis
-    x_label = np.empty(canvas.shape[1], dtype='str')
-    x_label[:] = ' '
+    # add both x-axis and legend to the canvas
+    x_label = np.empty(canvas.shape[1], dtype=np.uint8)
+    draw_x_label(x_label, x_min, x_max, legend)
+    canvas = np.vstack((canvas, x_label))
+
+    # create and add y-axis to the canvas
+    y_label = np.empty((canvas.shape[0], label_gutter(y_min, y_max)), dtype=np.uint8)
+    draw_y_label(y_label, y_min, y_max)
+    canvas = np.hstack((y_label, canvas))
+
+    return canvas
+
+
+def draw_x_label(
+    x_label: NDArray,
+    x_min: float,
+    x_max: float,
+    legend: Optional[str] = None,
+) -> NDArray:
+    """
+    Write the x-axis limits and the centered legend into a row, in place.
+    :param x_label:
+    :param x_min:
+    :param x_max:
+    :param legend:
+    :return:
+    """
+    x_label[:] = glyph(' ')
 
     x_min = math.floor(x_min)
     x_max = math.ceil(x_max)
-    x_label[0:len(str(x_min))] = list(str(x_min))
-    x_label[-len(str(x_max)):] = list(str(x_max))
+    x_label[0:len(str(x_min))] = encode_text(str(x_min))
+    x_label[-len(str(x_max)):] = encode_text(str(x_max))
 
     # add legend to x-axis
     if legend is not None:
         legend_start = math.floor((len(x_label) - len(legend)) / 2)
         legend_end = -math.ceil((len(x_label) - len(legend)) / 2)
-        x_label[legend_start:legend_end] = list(legend)
+        x_label[legend_start:legend_end] = encode_text(legend)
+    return x_label
 
-    # add both x-axis and legend to the canvas
-    canvas = np.vstack((canvas, x_label))
 
-    # create and add y-axis to the canvas
-    y_label = np.empty((canvas.shape[0], 3), dtype="str")
-    y_label[:] = ' '
-
-    y_min = math.floor(y_min)
-    y_max = math.ceil(y_max)
-    y_label[-2, -len(str(y_min)):] = list(str(y_min))
-    y_label[0, -len(str(y_max)):] = list(str(y_max))
-    y_label = y_label.reshape(y_label.shape[0], -1)
-    canvas = np.hstack((y_label, canvas))
+def draw_y_label(y_label: NDArray, y_min: float, y_max: float) -> NDArray:
+    """
+    Write the y-axis limits into the gutter left of the canvas, in place.
+    The gutter has one row per canvas row plus one for the x-axis, and must
+    be at least `label_gutter` wide.
+    :param y_label:
+    :param y_min:
+    :param y_max:
+    :return:
+    """
+    y_label[:] = glyph(' ')
 
-    return canvas
+    size = y_label.shape[1]
+    y_min = _fit_label(y_min, size, math.floor)
+    y_max = _fit_label(y_max, size, math.ceil)
+    if max(len(y_min), len(y_max)) > size:
+        raise ValueError(f'the y-axis labels {y_min} and {y_max} need a wider gutter than {size}, see label_gutter')
+    y_label[-2, -len(y_min):] = encode_text(y_min)
+    y_label[0, -len(y_max):] = encode_text(y_max)
+    return y_label
+
+
+def _fit_label(value: float, size: int, rounding) -> str:
+    """
+    Format an axis limit in at most `size` characters when possible, switching
+    to k/M/G/T suffixes for large values. A suffix is only used for values of
+    at least one whole unit of it, so the label keeps the order of magnitude;
+    when no label fits, the shortest one is returned whole.
+    :param value:
+    :param size:
+    :param rounding: math.floor for lower limits, math.ceil for upper ones
+    :return:
+
+    >>> _fit_label(-0.5, 3, math.floor), _fit_label(-1234, 3, math.floor), _fit_label(123456, 3, math.ceil)
+    ('-1', '-2k', '124k')
+    >>> _fit_label(-12345, 3, math.floor), _fit_label(-130, 3, math.ceil), _fit_label(123e12, 3, math.ceil)
+    ('-13k', '-130', '123T')
+    """
+    shortest = label = str(rounding(value))
+    for suffix, scale in (('k', 1e3), ('M', 1e6), ('G', 1e9), ('T', 1e12)):
+        if len(label) <= size or abs(value) < scale:
+            break
+        label = f'{rounding(value / scale)}{suffix}'
+        shortest = min(shortest, label, key=len)
+    return label if len(label) <= size else shortest
+
+
+def label_gutter(y_min: float, y_max: float) -> int:
+    """
+    Width of the y-axis gutter that fits the labels of these limits.
+    :param y_min:
+    :param y_max:
+    :return: at least GUTTER
+
+    >>> label_gutter(0, 99), label_gutter(-12345, 10)
+    (3, 4)
+    """
+    labels = _fit_label(y_min, GUTTER, math.floor), _fit_label(y_max, GUTTER, math.ceil)
+    return max(GUTTER, *map(len, labels))
 
 
 def add_title(canvas: NDArray, title: str) -> NDArray:
@@ -164,49 +561,884 @@ def add_title(canvas: NDArray, title: str) -> NDArray:
     :param title:
     :return:
     """
-    width = canvas.shape[1]
-    title_arr = np.empty(width, dtype="str")
-    title_arr[:] = ' '
+    title_arr = np.empty(canvas.shape[1], dtype=np.uint8)
+    draw_title(title_arr, title)
+    return np.vstack((title_arr, canvas))
+
+
+def draw_title(title_arr: NDArray, title: str) -> NDArray:
+    """
+    Write the centered title into a row, in place.
+    :param title_arr:
+    :param title:
+    :return:
+    """
+    width = len(title_arr)
+    title_arr[:] = glyph(' ')
 
     title_start = math.floor((width - len(title)) / 2)
     title_end = -math.ceil((width - len(title)) / 2)
-    title_arr[title_start:title_end] = list(title)
+    title_arr[title_start:title_end] = encode_text(title)
+    return title_arr
 
-    return np.vstack((title_arr, canvas))
+
+# a chart laid out in one buffer: `page` holds the chart plus a newline
+# column, the other fields are writable views into it
+Frame: NamedTuple = namedtuple('Frame', 'page chart title plot x_label y_label')
+# minimum width of the y-axis gutter, wider labels widen it, see label_gutter
+GUTTER: int = 3
+
+
+@lru_cache(maxsize=128)
+def _frame_template(width: int, height: int, grid: bool, gutter: int = GUTTER) -> NDArray:
+    """
+    Build the page of an empty chart, with borders, grid and newlines.
+    :param width:
+    :param height:
+    :param grid:
+    :param gutter: width of the y-axis labels
+    :return:
+    """
+    page = np.full((height + 2, width + gutter + 1), glyph(' '), dtype=np.uint8)
+    page[:, -1] = ord('\n')
+    page[1:height + 1, gutter:-1] = initialize_canvas(width, height, grid)
+    page.flags.writeable = False
+    return page
+
+
+def frame_views(page: NDArray, width: int, height: int, gutter: int = GUTTER) -> Frame:
+    """
+    Carve the regions of a chart out of a page buffer, without copying.
+    :param page:
+    :param width:
+    :param height:
+    :param gutter: width of the y-axis labels
+    :return:
+    """
+    chart = page[:, :width + gutter]
+    return Frame(
+        page=page,
+        chart=chart,
+        title=chart[0],
+        plot=chart[1:height + 1, gutter:],
+        x_label=chart[height + 1, gutter:],
+        y_label=chart[1:, :gutter],
+    )
+
+
+def new_frame(
+    width: int,
+    height: int,
+    grid: bool = False,
+    page: Optional[NDArray] = None,
+    gutter: int = GUTTER,
+) -> Frame:
+    """
+    Allocate a chart frame, or reset a previously allocated page, from the
+    cached empty chart of that size.
+    :param width:
+    :param height:
+    :param grid:
+    :param page: a page of the same size to reuse, may leave out the newline column
+    :param gutter: width of the y-axis labels, see label_gutter
+    :return:
+
+    >>> frame = new_frame(5, 2, True)
+    >>> frame.page.shape, frame.plot.shape, frame.y_label.shape
+    ((4, 9), (2, 5), (3, 3))
+    """
+    template = _frame_template(width, height, grid, gutter)
+    if page is None:
+        page = template.copy()
+    else:
+        np.copyto(page, template[:, :page.shape[1]])
+    return frame_views(page, width, height, gutter)
+
+
+def write_frame(frame: Frame, out: Optional[IO] = None) -> None:
+    """
+    Write a whole frame with a single call.
+    :param frame:
+    :param out: text or binary file, defaults to the standard output
+    :return:
+    """
+    _write_text(decode_text(frame.page), out)
+
+
+def _chunk_reader(x, y: Optional[ArrayLike], chunk_size: int):
+    """
+    Get a function returning fresh (x, y) chunk iterators over the input.
+    :param x: the x values, or a source for `iter_source` when y is None
+    :param y:
+    :param chunk_size:
+    :return:
+    """
+    if y is None:
+        return partial(iter_source, x, chunk_size)
+    return partial(array_chunks, x, y, chunk_size)
 
 
 def plot(
     x: ArrayLike,
-    y: ArrayLike,
+    y: Optional[ArrayLike] = None,
     display_grid: bool = False,
     height: int = 15,
     width: int = 100,
     title: str = '',
     legend: str = '',
+    decimation: str = 'none',
+    out: Optional[IO] = None,
+    page: Optional[NDArray] = None,
+    chunk_size: int = CHUNK_SIZE,
 ):
     """
     A single function for plotting.
+    The input is read in two passes over chunks of `chunk_size` samples:
+    one for the limits, one to draw the points.
+    :param x: the x values, or a file path or callable for `iter_source`
+    :param y: the y values, None when x is a source
+    :param display_grid:
+    :param height:
+    :param width:
+    :param title:
+    :param legend:
+    :param decimation: one of DECIMATION_STRATEGIES, see `decimate`; 'none'
+        draws every sample, 'auto' decimates long series
+    :param out: text or binary file, defaults to the standard output
+    :param page: a page from an earlier `new_frame` of the same size to reuse,
+        ignored when the y-axis labels need another gutter
+    :param chunk_size:
+    :return:
+    """
+    assert decimation in DECIMATION_STRATEGIES
+    chunks = _chunk_reader(x, y, chunk_size)
+    limits = scan_limits(chunks())
+    if decimation == 'auto':
+        decimation = 'minmax' if limits.count > DECIMATION_FACTOR * width else 'none'
+
+    gutter = label_gutter(limits.y_min, limits.y_max)
+    if page is not None and page.shape != (height + 2, width + gutter + 1):
+        page = None
+    frame = new_frame(width, height, display_grid, page, gutter)
+    # the rows of the plot region are stored top-down, points are bottom-up
+    plot_area = frame.plot[::-1]
+    code = glyph('*') if display_grid else glyph('·')
+    if decimation == 'none':
+        for x_chunk, y_chunk in chunks():
+            rows = _to_cells(y_chunk, limits.y_min, limits.y_max, height)
+            plot_area[rows, _to_cells(x_chunk, limits.x_min, limits.x_max, width)] = code
+    else:
+        cols, ys = decimate_chunks(chunks(), limits, width, decimation)
+        plot_area[_to_cells(ys, limits.y_min, limits.y_max, height), cols] = code
+    draw_x_label(frame.x_label, limits.x_min, limits.x_max, legend)
+    draw_y_label(frame.y_label, limits.y_min, limits.y_max)
+    draw_title(frame.title, title)
+    write_frame(frame, out)
+
+
+# glyphs given to the series of `plot_many`, in order
+SERIES_GLYPHS: str = '*o+x#@%&'
+
+
+def _flatten_series(series) -> Tuple[NDArray, NDArray, NDArray]:
+    """
+    Concatenate several series into flat x and y arrays.
+    :param series: a 2D array with one series per row, or a list of (x, y) pairs
+    :return: x, y and the offset where each series starts
+    """
+    if isinstance(series, np.ndarray):
+        assert series.ndim == 2
+        n_series, n = series.shape
+        x = np.tile(np.arange(n), n_series)
+        return x, series.ravel(), np.arange(0, n_series * n, n)
+
+    lengths = [len(y) for _, y in series]
+    assert all(len(x) == len(y) for x, y in series)
+    x = np.concatenate([np.asarray(x, dtype=float) for x, _ in series])
+    y = np.concatenate([np.asarray(y, dtype=float) for _, y in series])
+    return x, y, np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+
+def plot_many(
+    series,
+    layout: str = 'overlay',
+    glyphs: str = SERIES_GLYPHS,
+    names: Optional[list] = None,
+    columns: int = 4,
+    display_grid: bool = False,
+    height: int = 15,
+    width: int = 100,
+    title: str = '',
+    legend: Optional[str] = None,
+    out: Optional[IO] = None,
+):
+    """
+    Plot several series at once, either overlaid on one canvas or as a grid
+    of small multiples. All series are normalized and drawn together with
+    vectorized operations and the result is written with a single call.
+    :param series: a 2D array with one series per row, or a list of (x, y) pairs
+    :param layout: 'overlay' or 'grid'
+    :param glyphs: one glyph per series, cycled when there are more series
+    :param names: series names, shown in the legend or as the panel titles
+    :param columns: number of panels per row of the grid
+    :param display_grid:
+    :param height: height of the canvas, or of every panel
+    :param width: width of the canvas, or of every panel
+    :param title: title of the overlay chart, ignored by the grid layout
+    :param legend: defaults to the glyph of every named series
+    :param out: text or binary file, defaults to the standard output
+    :return:
+    """
+    assert layout in ('overlay', 'grid')
+    x, y, starts = _flatten_series(series)
+    n_series = len(starts)
+    ids = np.repeat(np.arange(n_series), np.diff(np.append(starts, len(x))))
+    codes = np.array([glyph(glyphs[i % len(glyphs)]) for i in range(n_series)], dtype=np.uint8)
+
+    # per series limits in one pass over all the samples
+    x_lo, x_hi = np.minimum.reduceat(x, starts), np.maximum.reduceat(x, starts)
+    y_lo, y_hi = np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+    if layout == 'overlay':
+        if legend is None and names is not None:
+            legend = '  '.join(f'{glyphs[i % len(glyphs)]} {name}' for i, name in enumerate(names))
+        x_min, x_max, y_min, y_max = x_lo.min(), x_hi.max(), y_lo.min(), y_hi.max()
+        frame = new_frame(width, height, display_grid, gutter=label_gutter(y_min, y_max))
+        cols = _to_cells(x, x_min, x_max, width)
+        rows = _to_cells(y, y_min, y_max, height)
+        # later series are drawn on top of earlier ones
+        frame.plot[::-1][rows, cols] = codes[ids]
+        draw_x_label(frame.x_label, x_min, x_max, legend)
+        draw_y_label(frame.y_label, y_min, y_max)
+        draw_title(frame.title, title)
+        write_frame(frame, out)
+        return
+
+    # small multiples: every panel is a frame carved out of one shared page
+    n_rows = math.ceil(n_series / columns)
+    # all the panels share the gutter of the widest labels
+    gutter = max(label_gutter(lo, hi) for lo, hi in zip(y_lo, y_hi))
+    panel_h, panel_w = height + 2, width + gutter
+    page = np.full((n_rows * panel_h, columns * panel_w + 1), glyph(' '), dtype=np.uint8)
+    page[:, -1] = ord('\n')
+
+    frames = []
+    for i in range(n_series):
+        r, c = divmod(i, columns)
+        region = page[r * panel_h:(r + 1) * panel_h, c * panel_w:(c + 1) * panel_w]
+        frames.append(new_frame(width, height, display_grid, region, gutter))
+
+    cols = _to_cells(x, x_lo[ids], x_hi[ids], width)
+    rows = _to_cells(y, y_lo[ids], y_hi[ids], height)
+    panel_row, panel_col = np.divmod(ids, columns)
+    # plot rows are stored top-down, right below the title row of each panel
+    page[panel_row * panel_h + height - rows, panel_col * panel_w + gutter + cols] = codes[ids]
+    for i, frame in enumerate(frames):
+        draw_x_label(frame.x_label, x_lo[i], x_hi[i], legend)
+        draw_y_label(frame.y_label, y_lo[i], y_hi[i])
+        draw_title(frame.title, names[i] if names is not None else '')
+    _write_text(decode_text(page), out)
+
+
+# glyphs for increasing point density, the first one stands for empty cells
+DENSITY_RAMP: str = ' .:-=+*#%@'
+
+
+def density_counts(
+    x: ArrayLike,
+    y: ArrayLike,
+    width: int,
+    height: int,
+    chunk_size: int = CHUNK_SIZE,
+) -> NDArray:
+    """
+    Count the points falling in every canvas cell. The points are binned
+    `chunk_size` at a time with np.bincount, so the temporaries stay the
+    same size no matter how many points there are.
     :param x:
     :param y:
+    :param width:
+    :param height:
+    :param chunk_size:
+    :return: counts with shape (height, width), row 0 at the bottom
+
+    >>> density_counts([0, 0, 1, 2], [0, 0, 1, 2], 3, 2).tolist()
+    [[2, 1, 0], [0, 0, 1]]
+    """
+    limits = scan_limits(array_chunks(x, y, chunk_size))
+    return bin_chunks(array_chunks(x, y, chunk_size), limits, width, height)
+
+
+def bin_chunks(
+    chunks: Iterator[Tuple[NDArray, NDArray]],
+    limits: Limits,
+    width: int,
+    height: int,
+) -> NDArray:
+    """
+    Count the points of (x, y) chunks in every canvas cell, see `density_counts`.
+    :param chunks:
+    :param limits: the limits of the whole series
+    :param width:
+    :param height:
+    :return:
+    """
+    counts = np.zeros(height * width, dtype=np.int64)
+    for x, y in chunks:
+        cols = _to_cells(x, limits.x_min, limits.x_max, width)
+        rows = _to_cells(y, limits.y_min, limits.y_max, height)
+        counts += np.bincount(rows * width + cols, minlength=height * width)
+    return counts.reshape(height, width)
+
+
+def density_glyphs(counts: NDArray, ramp: str = DENSITY_RAMP, log_scale: bool = False) -> NDArray:
+    """
+    Map cell counts to the glyphs of a ramp, empty cells get the first glyph.
+    :param counts:
+    :param ramp:
+    :param log_scale: scale by log(1 + count) so sparse cells stay visible
+    :return: the canvas code of every cell
+
+    >>> decode_text(density_glyphs(np.array([0, 1, 5, 10]), ' .o@'))
+    ' .o@'
+    """
+    codes = encode_text(ramp)
+    levels = counts.astype(float)
+    if log_scale:
+        levels = np.log1p(levels)
+    top = levels.max()
+    if top == 0:
+        return np.full(counts.shape, codes[0], dtype=np.uint8)
+    # non-empty cells always get at least the second glyph
+    idx = np.ceil(levels / top * (len(codes) - 1)).astype(int)
+    return codes[idx]
+
+
+def plot_density(
+    x: ArrayLike,
+    y: Optional[ArrayLike] = None,
+    display_grid: bool = False,
+    height: int = 15,
+    width: int = 100,
+    title: str = '',
+    legend: str = '',
+    ramp: str = DENSITY_RAMP,
+    log_scale: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    out: Optional[IO] = None,
+):
+    """
+    Plot a scatter as a density map: every cell shows how many points fell in
+    it through a glyph ramp instead of a single point glyph.
+    :param x: the x values, or a file path or callable for `iter_source`
+    :param y: the y values, None when x is a source
     :param display_grid:
     :param height:
     :param width:
     :param title:
     :param legend:
+    :param ramp: glyphs for increasing density, the first one for empty cells
+    :param log_scale:
+    :param chunk_size: number of points binned at once
+    :param out: text or binary file, defaults to the standard output
     :return:
     """
-    canvas = initialize_canvas(width, height, display_grid)
-    canvas = draw_points(x, y, canvas, display_grid)
-    canvas = label_axis(
-        canvas,
-        np.amin(x),
-        np.amax(x),
-        np.amin(y),
-        np.amax(y),
-        legend,
-    )
-    canvas = add_title(canvas, title)
-    print_chart(canvas)
+    chunks = _chunk_reader(x, y, chunk_size)
+    limits = scan_limits(chunks())
+    frame = new_frame(width, height, display_grid, gutter=label_gutter(limits.y_min, limits.y_max))
+    counts = bin_chunks(chunks(), limits, width, height)
+    filled = counts > 0
+    frame.plot[::-1][filled] = density_glyphs(counts, ramp, log_scale)[filled]
+    draw_x_label(frame.x_label, limits.x_min, limits.x_max, legend)
+    draw_y_label(frame.y_label, limits.y_min, limits.y_max)
+    draw_title(frame.title, title)
+    write_frame(frame, out)
+
+
+def _column_bounds(start: int, end: int, width: int) -> NDArray:
+    """
+    First sample of every canvas column for samples [start, end), with
+    `end` appended, using the same mapping as `_to_cells`.
+    :param start:
+    :param end:
+    :param width:
+    :return:
+
+    >>> _column_bounds(0, 10, 4).tolist()
+    [0, 3, 6, 9, 10]
+    """
+    cols = np.arange(width + 1)
+    if end - start == 1:
+        return np.where(cols == 0, start, end)
+    bounds = start + np.ceil(cols * (end - 1 - start) / (width - 1)).astype(np.int64)
+    bounds = np.clip(bounds, start, end)
+    # the float estimate can be one sample off either way
+    bounds -= (bounds > start) & (_to_cells(bounds - 1, start, end - 1, width) >= cols)
+    bounds += (bounds < end) & (_to_cells(bounds, start, end - 1, width) < cols)
+    bounds[-1] = end
+    return bounds
+
+
+class PyramidIndex:
+    """
+    A multi-resolution min/max index over a long series, for zooming and
+    panning without rescanning the data.
+
+    Level k holds the min, max and count of the non-NaN samples of every
+    block of 2**k samples, from `min_level` up to a single block. The
+    levels live in .npy files in a directory and are memory-mapped, so a
+    window of any size is drawn by reading a few blocks per canvas column.
+    """
+    def __init__(self, directory: str) -> None:
+        """
+        Open an index built by `PyramidIndex.build`.
+        :param directory:
+        """
+        self.directory: str = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        self.length: int = meta['length']
+        self.min_level: int = meta['min_level']
+        self.max_level: int = meta['max_level']
+        self.series: NDArray = np.load(os.path.join(directory, meta['series']), mmap_mode='r')
+        self.levels: dict = {
+            k: tuple(np.load(self._level_path(directory, k, part), mmap_mode='r')
+                     for part in ('min', 'max', 'count'))
+            for k in range(self.min_level, self.max_level + 1)
+        }
+
+    @staticmethod
+    def _level_path(directory: str, level: int, part: str) -> str:
+        """
+        Path of the min, max or count array of a level.
+        :param directory:
+        :param level:
+        :param part:
+        :return:
+        """
+        return os.path.join(directory, f'level_{level:02d}_{part}.npy')
+
+    @classmethod
+    def build(
+        cls,
+        series,
+        directory: str,
+        min_level: int = 4,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> 'PyramidIndex':
+        """
+        Build the index of a series, reading it `chunk_size` samples at a time.
+        :param series: a 1D array, or the path of a 1D .npy file which the
+            index then refers to instead of copying it
+        :param directory: created if needed
+        :param min_level: finest level stored, finer windows read the series
+        :param chunk_size: rounded down to a multiple of 2**min_level
+        :return:
+        """
+        os.makedirs(directory, exist_ok=True)
+        if isinstance(series, (str, os.PathLike)):
+            series_path = os.path.abspath(series)
+        else:
+            series_path = 'series.npy'
+            np.save(os.path.join(directory, series_path), np.asarray(series))
+        data = np.load(os.path.join(directory, series_path), mmap_mode='r')
+        assert data.ndim == 1
+
+        # the finest level comes straight from the series
+        stride = 1 << min_level
+        chunk_size = max(chunk_size // stride, 1) * stride
+        blocks = -(-len(data) // stride)
+        outputs = cls._open_level(directory, min_level, blocks, data.dtype)
+        for start in range(0, len(data), chunk_size):
+            chunk = np.asarray(data[start:start + chunk_size], dtype=float)
+            chunk = np.pad(chunk, (0, -len(chunk) % stride), constant_values=np.nan)
+            chunk = chunk.reshape(-1, stride)
+            block = slice(start // stride, start // stride + len(chunk))
+            with warnings.catch_warnings():
+                # blocks without any valid sample are NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                outputs[0][block] = np.nanmin(chunk, axis=1)
+                outputs[1][block] = np.nanmax(chunk, axis=1)
+            outputs[2][block] = np.count_nonzero(~np.isnan(chunk), axis=1)
+
+        # every other level merges pairs of blocks of the level below
+        level = min_level
+        while blocks > 1:
+            inputs = outputs
+            blocks = -(-blocks // 2)
+            level += 1
+            outputs = cls._open_level(directory, level, blocks, data.dtype)
+            for start in range(0, len(inputs[0]), chunk_size):
+                lo, hi, count = (np.asarray(arr[start:start + chunk_size]) for arr in inputs)
+                if len(lo) % 2:
+                    lo, hi = np.append(lo, np.nan), np.append(hi, np.nan)
+                    count = np.append(count, 0)
+                block = slice(start // 2, start // 2 + len(lo) // 2)
+                outputs[0][block] = np.fmin(lo[0::2], lo[1::2])
+                outputs[1][block] = np.fmax(hi[0::2], hi[1::2])
+                outputs[2][block] = count[0::2] + count[1::2]
+            for arr in inputs:
+                arr.flush()
+        for arr in outputs:
+            arr.flush()
+
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(dict(
+                length=len(data),
+                min_level=min_level,
+                max_level=level,
+                series=series_path,
+            ), f)
+        return cls(directory)
+
+    @classmethod
+    def _open_level(cls, directory: str, level: int, blocks: int, dtype) -> Tuple:
+        """
+        Create the writable min, max and count arrays of a level.
+        :param directory:
+        :param level:
+        :param blocks:
+        :param dtype:
+        :return:
+        """
+        dtype = np.result_type(dtype, np.float32)
+        return tuple(
+            np.lib.format.open_memmap(
+                cls._level_path(directory, level, part),
+                mode='w+',
+                dtype=np.int64 if part == 'count' else dtype,
+                shape=(blocks,),
+            )
+            for part in ('min', 'max', 'count')
+        )
+
+    def window(self, start: int, end: int, width: int) -> Tuple[NDArray, NDArray, NDArray]:
+        """
+        Min and max of every canvas column for samples [start, end), exactly
+        as `decimate` would find them. Every column is split into aligned
+        blocks, at most two per level, plus fewer than 2**min_level samples
+        at each end which are read from the series, so the work depends on
+        the canvas width and the number of levels only.
+        :param start:
+        :param end:
+        :param width:
+        :return: the non-empty columns and their min and max
+        """
+        start, end = max(start, 0), min(end, self.length)
+        assert start < end
+        bounds = _column_bounds(start, end, width)
+        lo, hi = bounds[:-1], bounds[1:]
+        col_min = np.full(width, np.nan)
+        col_max = np.full(width, np.nan)
+        col_count = np.zeros(width, dtype=np.int64)
+
+        def _merge(mask: NDArray, block_min: NDArray, block_max: NDArray, count: NDArray) -> None:
+            col_min[mask] = np.fmin(col_min[mask], block_min)
+            col_max[mask] = np.fmax(col_max[mask], block_max)
+            col_count[mask] += count
+
+        # the unaligned ends of every column come from the series itself
+        size = 1 << self.min_level
+        head_end = np.minimum(-(-lo // size) * size, hi)
+        tail_start = np.maximum(hi // size * size, head_end)
+        for first, stop in ((lo, head_end), (tail_start, hi)):
+            idx = first[:, None] + np.arange(size - 1)
+            valid = idx < stop[:, None]
+            values = np.asarray(self.series[np.where(valid, idx, start)], dtype=float)
+            values[~valid] = np.nan
+            _merge(
+                slice(None),
+                np.fmin.reduce(values, axis=1),
+                np.fmax.reduce(values, axis=1),
+                np.count_nonzero(~np.isnan(values), axis=1),
+            )
+
+        # the aligned middle is covered bottom-up, like a segment tree query
+        lo, hi = head_end, tail_start
+        for level in range(self.min_level, self.max_level + 1):
+            if not np.any(lo < hi):
+                break
+            block_min, block_max, block_count = self.levels[level]
+            left = (lo < hi) & ((lo >> level) & 1 == 1)
+            blocks = lo[left] >> level
+            _merge(left, block_min[blocks], block_max[blocks], block_count[blocks])
+            lo = lo + (left << level)
+            right = (lo < hi) & ((hi >> level) & 1 == 1)
+            blocks = (hi[right] >> level) - 1
+            _merge(right, block_min[blocks], block_max[blocks], block_count[blocks])
+            hi = hi - (right << level)
+
+        filled = np.flatnonzero(col_count > 0)
+        return filled, col_min[filled], col_max[filled]
+
+    def plot(
+        self,
+        start: int = 0,
+        end: Optional[int] = None,
+        display_grid: bool = False,
+        height: int = 15,
+        width: int = 100,
+        title: str = '',
+        legend: str = '',
+        out: Optional[IO] = None,
+    ):
+        """
+        Plot samples [start, end) of the series, like `plot` with 'minmax'
+        decimation, with the sample number on the x-axis.
+        :param start:
+        :param end: defaults to the end of the series
+        :param display_grid:
+        :param height:
+        :param width:
+        :param title:
+        :param legend:
+        :param out: text or binary file, defaults to the standard output
+        :return:
+        """
+        end = self.length if end is None else end
+        cols, col_lo, col_hi = self.window(start, end, width)
+        y_min, y_max = col_lo.min(), col_hi.max()
+
+        frame = new_frame(width, height, display_grid, gutter=label_gutter(y_min, y_max))
+        code = glyph('*') if display_grid else glyph('·')
+        frame.plot[::-1][_to_cells(col_lo, y_min, y_max, height), cols] = code
+        frame.plot[::-1][_to_cells(col_hi, y_min, y_max, height), cols] = code
+        draw_x_label(frame.x_label, start, end - 1, legend)
+        draw_y_label(frame.y_label, y_min, y_max)
+        draw_title(frame.title, title)
+        write_frame(frame, out)
+
+
+class LivePlotter:
+    """
+    A stateful plotter for streaming data.
+
+    The last `capacity` points are kept in a ring buffer which is swept
+    from left to right like an oscilloscope trace: every new point
+    overwrites the oldest one and only the canvas column of that slot and
+    the axis labels are redrawn. `render` sends the changed cells to the
+    terminal as ANSI cursor updates instead of reprinting the chart.
+
+    The x-axis labels show the range of x in the buffer, oldest to newest,
+    and not the x of the columns under them: once the sweep wraps, the
+    newest points are left of the sweep head and the oldest right of it.
+    """
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        display_grid: bool = False,
+        height: int = 15,
+        width: int = 100,
+        title: str = '',
+        legend: str = '',
+        y_range: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        """
+        Initialize a live plotter.
+        :param capacity: number of points kept, defaults to the canvas width
+        :param display_grid:
+        :param height:
+        :param width:
+        :param title:
+        :param legend:
+        :param y_range: fixed (y_min, y_max), auto-ranged when omitted
+        """
+        self.capacity: int = max(capacity or width, 2)
+        self.height: int = height
+        self.width: int = width
+        self.title: str = title
+        self.legend: str = legend
+        self.grid: bool = display_grid
+        self.glyph: int = glyph('*') if display_grid else glyph('·')
+        self.background: NDArray = initialize_canvas(width, height, display_grid)
+
+        self._x: NDArray = np.full(self.capacity, np.nan)
+        self._y: NDArray = np.full(self.capacity, np.nan)
+        self._rows: NDArray = np.full(self.capacity, -1)
+        self._head: int = 0
+        self._count: int = 0
+        self._total: int = 0
+        self._fixed_range: bool = y_range is not None
+        self._y_min, self._y_max = y_range if y_range is not None else (0., 0.)
+
+        # ring slot -> canvas column, and canvas column -> first ring slot
+        slots = np.arange(self.capacity)
+        self._cols: NDArray = np.floor(slots / (self.capacity - 1) * (width - 1)).astype(int)
+        self._col_start: NDArray = np.searchsorted(self._cols, np.arange(width + 1))
+
+        self._gutter: int = label_gutter(self._y_min, self._y_max)
+        self._frame: Frame = new_frame(width, height, display_grid, gutter=self._gutter)
+        self._x_label: NDArray = self._frame.x_label.copy()
+        self._compose()
+        self._dirty: dict = {}
+        self._drawn: bool = False
+        self._full_redraw: bool = True
+
+    @property
+    def frame(self) -> NDArray:
+        """the full chart, including title and axis labels"""
+        return self._frame.chart
+
+    def _compose(self) -> None:
+        """
+        Redraw the whole chart from the ring buffer. The gutter only ever
+        widens, so a full redraw covers the previous chart.
+        :return:
+        """
+        gutter = label_gutter(self._y_min, self._y_max)
+        if gutter > self._gutter:
+            self._gutter = gutter
+            self._frame = new_frame(self.width, self.height, self.grid, gutter=gutter)
+        new_frame(self.width, self.height, self.grid, self._frame.page, self._gutter)
+        valid = self._rows >= 0
+        self._frame.plot[::-1][self._rows[valid], self._cols[valid]] = self.glyph
+        draw_x_label(self._frame.x_label, *self._x_limits(), self.legend)
+        draw_y_label(self._frame.y_label, self._y_min, self._y_max)
+        draw_title(self._frame.title, self.title)
+
+    def _x_limits(self) -> Tuple[float, float]:
+        """
+        Oldest and newest x in the ring buffer, the range the x-axis labels
+        show. Once the sweep wraps these are at the columns right and left of
+        the sweep head, not at the ends of the axis.
+        :return:
+        """
+        if self._count == 0:
+            return 0, 0
+        newest = self._x[self._head - 1]
+        oldest = self._x[self._head] if self._count == self.capacity else self._x[0]
+        return oldest, newest
+
+    def _to_rows(self, y: ArrayLike) -> NDArray:
+        """
+        Map y values to canvas rows, counted from the bottom.
+        :param y:
+        :return:
+        """
+        span = self._y_max - self._y_min
+        if span == 0:
+            return np.full(np.shape(y), (self.height - 1) // 2)
+        rows = np.floor((np.asarray(y) - self._y_min) / span * (self.height - 1))
+        return np.clip(rows, 0, self.height - 1).astype(int)
+
+    def _mark(self, row: int, start: int, end: int) -> None:
+        """
+        Mark frame cells [start, end) of a row as changed.
+        :param row:
+        :param start:
+        :param end:
+        :return:
+        """
+        lo, hi = self._dirty.get(row, (start, end))
+        self._dirty[row] = (min(lo, start), max(hi, end))
+
+    def _redraw_x_label(self) -> None:
+        """
+        Redraw the x-axis labels, marking only the cells that changed.
+        :return:
+        """
+        draw_x_label(self._x_label, *self._x_limits(), self.legend)
+        changed = np.flatnonzero(self._frame.x_label != self._x_label)
+        if len(changed):
+            self._frame.x_label[changed] = self._x_label[changed]
+            self._mark(self.height + 1, self._gutter + changed[0], self._gutter + changed[-1] + 1)
+
+    def _redraw_column(self, col: int) -> None:
+        """
+        Redraw one canvas column from the slots that map to it.
+        :param col:
+        :return:
+        """
+        column = self.background[:, col].copy()
+        rows = self._rows[self._col_start[col]:self._col_start[col + 1]]
+        column[rows[rows >= 0]] = self.glyph
+        # the plot region of the frame is stored top-down
+        frame_col = self._frame.plot[:, col]
+        changed = np.flatnonzero(frame_col != column[::-1])
+        frame_col[changed] = column[::-1][changed]
+        for row in changed:
+            self._mark(row + 1, col + self._gutter, col + self._gutter + 1)
+
+    def _fit_range(self, y: float) -> None:
+        """
+        Grow the auto y-range to include y and schedule a full redraw.
+        :param y:
+        :return:
+        """
+        if self._total == 0:
+            self._y_min = self._y_max = y
+        else:
+            # leave some headroom so a drifting signal doesn't rescale every frame
+            pad = (max(self._y_max, y) - min(self._y_min, y)) * 0.1
+            if y < self._y_min:
+                self._y_min = y - pad
+            if y > self._y_max:
+                self._y_max = y + pad
+        valid = ~np.isnan(self._y)
+        self._rows[valid] = self._to_rows(self._y[valid])
+        self._full_redraw = True
+
+    def append(self, y: float, x: Optional[float] = None) -> None:
+        """
+        Add a point, overwriting the oldest one once the buffer is full.
+        :param y:
+        :param x: defaults to the running sample number
+        :return:
+        """
+        if not self._fixed_range and (self._total == 0 or not self._y_min <= y <= self._y_max):
+            self._fit_range(y)
+
+        slot = self._head
+        self._x[slot] = self._total if x is None else x
+        self._y[slot] = y
+        self._rows[slot] = self._to_rows(y)
+        self._head = (slot + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self._total += 1
+
+        if self._full_redraw:
+            self._compose()
+            return
+        self._redraw_column(self._cols[slot])
+        self._redraw_x_label()
+
+    def extend(self, ys: ArrayLike, xs: Optional[ArrayLike] = None) -> None:
+        """
+        Add several points.
+        :param ys:
+        :param xs:
+        :return:
+        """
+        xs = [None] * len(ys) if xs is None else xs
+        for y, x in zip(ys, xs):
+            self.append(y, x)
+
+    def render(self, out: Optional[IO] = None) -> None:
+        """
+        Draw the chart on a terminal. The first call prints the whole chart,
+        later calls only move the cursor to the changed cells and rewrite them.
+        :param out: text or binary file, defaults to the standard output
+        :return:
+        """
+        n_rows = self._frame.chart.shape[0]
+        if self._full_redraw or not self._drawn:
+            text = decode_text(self._frame.page)
+            if self._drawn:
+                # jump back to the top left corner of the previous chart
+                text = f'\x1b[{n_rows}A\r' + text
+        else:
+            updates = []
+            for row, (start, end) in sorted(self._dirty.items()):
+                cells = decode_text(self._frame.chart[row, start:end])
+                # save cursor, go up to the row, go to the column, restore
+                updates.append(f'\x1b7\x1b[{n_rows - row}A\x1b[{start + 1}G{cells}\x1b8')
+            text = ''.join(updates)
+        out = sys.stdout if out is None else out
+        _write_text(text, out)
+        out.flush()
+        self._dirty.clear()
+        self._drawn = True
+        self._full_redraw = False
 
 
 def plot_matplotlib(
@@ -217,19 +1449,86 @@ def plot_matplotlib(
     width: int = 100,
     title: str = '',
     legend: str = '',
-):
-    plt.figure(figsize=(width, height))
-    plt.plot(x, y)
-    plt.suptitle(title)
-    plt.xlabel(legend)
+    out_dir: str = 'data',
+    figure=None,
+) -> str:
+    """
+    Plot with matplotlib and save the chart as a PNG named after the title.
+    matplotlib is only imported here, so the ASCII plotter doesn't pay for it.
+    :param x:
+    :param y:
+    :param display_grid:
+    :param height:
+    :param width:
+    :param title:
+    :param legend:
+    :param out_dir:
+    :param figure: a matplotlib Figure to clear and reuse
+    :return: path of the PNG
+    """
+    from matplotlib.figure import Figure
+
+    # a bare Figure isn't tracked by pyplot, so nothing leaks between charts
+    fig = Figure() if figure is None else figure
+    fig.clear()
+    fig.set_size_inches(width, height)
+    ax = fig.add_subplot()
+    ax.plot(x, y)
+    fig.suptitle(title)
+    ax.set_xlabel(legend)
     save_at = '_'.join(title.split(' ')).lower() + '.png'
     if display_grid:
-        plt.grid()
-    plt.savefig(os.path.join('data', save_at))
+        ax.grid()
+    path = os.path.join(out_dir, save_at)
+    fig.savefig(path)
+    return path
+
+
+# the figure reused by every chart of a batch worker process
+_WORKER_FIGURE = None
 
 
+def _init_matplotlib_worker() -> None:
+    """set up a batch worker process to render headless"""
+    global _WORKER_FIGURE
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    _WORKER_FIGURE = Figure()
+
+
+def _render_matplotlib_spec(spec: dict) -> str:
+    """
+    Render one chart of a batch on the figure of the worker.
+    :param spec: keyword arguments for plot_matplotlib
+    :return:
+    """
+    return plot_matplotlib(figure=_WORKER_FIGURE, **spec)
+
+
+def render_matplotlib_batch(
+    specs: list,
+    processes: Optional[int] = None,
+    out_dir: str = 'data',
+) -> list:
+    """
+    Render many matplotlib charts in parallel on a pool of headless (Agg)
+    worker processes, each reusing a single figure.
+    :param specs: keyword arguments for plot_matplotlib, one dict per chart
+    :param processes: defaults to the number of CPUs
+    :param out_dir: used by the specs that don't set one
+    :return: paths of the PNGs, in the order of the specs
+    """
+    specs = [dict(dict(out_dir=out_dir), **spec) for spec in specs]
+    processes = processes or os.cpu_count() or 1
+    chunk = max(len(specs) // (4 * processes), 1)
+    with ProcessPoolExecutor(processes, initializer=_init_matplotlib_worker) as pool:
+        return list(pool.map(_render_matplotlib_spec, specs, chunksize=chunk))
+
+
+def examples():
+    charts = []
 
-def main():
     # Example 1
     scale = 0.1
     n = int(8 * math.pi / scale)
@@ -242,14 +1541,14 @@ def main():
         title="The sine function",
         legend="f(x) = sin(x), where 0 <= x <= 8π"
     )
-    plot_matplotlib(
-        x, y,
+    charts.append(dict(
+        x=x, y=y,
         display_grid=True,
         height=5,
         width=12,
         title="The sine function",
         legend="f(x) = sin(x), where 0 <= x <= 8π"
-    )
+    ))
 
     # Example 2
     scale = 0.1
@@ -262,13 +1561,13 @@ def main():
         title="The cosine function",
         legend="f(x) = cos(x), where 0 <= x <= 2π"
     )
-    plot_matplotlib(
-        x, y,
+    charts.append(dict(
+        x=x, y=y,
         height=5,
         width=12,
         title="The cosine function",
         legend="f(x) = cos(x), where 0 <= x <= 2π"
-    )
+    ))
 
     # Example 3
     y = [ord(c) for c in 'ASCII Plotter example']
@@ -279,13 +1578,48 @@ def main():
         title="Plotting Random Data",
         legend="f(x) = random data"
     )
-    plot_matplotlib(
-        x, y,
+    charts.append(dict(
+        x=x, y=y,
         height=5,
         width=12,
         title="Plotting Random Data",
         legend="f(x) = random data"
+    ))
+
+    # the matplotlib versions are rendered together, in parallel
+    render_matplotlib_batch(charts)
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='Plot a series in the terminal.')
+    parser.add_argument('source', nargs='?',
+                        help='.npy or CSV file with y, or x and y, columns; runs the examples if omitted')
+    parser.add_argument('--width', type=int, default=100)
+    parser.add_argument('--height', type=int, default=15)
+    parser.add_argument('--title', default='')
+    parser.add_argument('--legend', default='')
+    parser.add_argument('--grid', action='store_true')
+    parser.add_argument('--decimation', choices=DECIMATION_STRATEGIES, default='none')
+    parser.add_argument('--density', action='store_true', help='plot point density instead of points')
+    parser.add_argument('--log', action='store_true', help='log scale for --density')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.source is None:
+        examples()
+        return
+    options = dict(
+        display_grid=args.grid,
+        height=args.height,
+        width=args.width,
+        title=args.title,
+        legend=args.legend,
+        chunk_size=args.chunk_size,
     )
+    if args.density:
+        plot_density(args.source, log_scale=args.log, **options)
+    else:
+        plot(args.source, decimation=args.decimation, **options)
 
 
 if __name__ == '__main__':
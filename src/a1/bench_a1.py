@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""Benchmarks for the a1 ASCII plotting pipeline"""
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+from typing import Callable, Optional
+
+import a1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench
+
+BASELINE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_a1_baseline.json')
+SIZES: list = [10 ** k for k in range(2, 8)]
+CANVASES: list = ['50x10', '100x15', '200x60']
+# slowdowns smaller than this are timer noise, not regressions
+MIN_DELTA: float = 5e-5
+
+
+def gen_data(n: int) -> tuple:
+    """
+    Generate a noisy sine wave with n samples.
+    :param n:
+    :return:
+    """
+    rng = np.random.default_rng(0)
+    x = np.arange(n, dtype=float)
+    y = np.sin(x / max(n / 20, 1)) + rng.normal(0, 0.1, n)
+    return x, y
+
+
+def stages(x, y, width: int, height: int, sink) -> dict:
+    """
+    Map each stage name to a function returning the arguments of a run,
+    and the function to time.
+    :param x:
+    :param y:
+    :param width:
+    :param height:
+    :param sink: file the rendering stages write to
+    :return:
+    """
+    def _drawn():
+        return a1.draw_points(x, y, a1.initialize_canvas(width, height), False)
+
+    def _labelled():
+        return a1.label_axis(_drawn(), x[0], x[-1], y.min(), y.max(), 'legend')
+
+    return {
+        'initialize_canvas': (lambda: (width, height), a1.initialize_canvas),
+        'preprocess_data': (lambda: (x, y, a1.initialize_canvas(width, height)), a1.preprocess_data),
+        'draw_points': (lambda: (x, y, a1.initialize_canvas(width, height), False), a1.draw_points),
+        'label_axis': (lambda: (_drawn(), x[0], x[-1], y.min(), y.max(), 'legend'), a1.label_axis),
+        'add_title': (lambda: (_labelled(), 'title'), a1.add_title),
+        'print_chart': (lambda: (a1.add_title(_labelled(), 'title'), sink), a1.print_chart),
+        'plot': (lambda: (x, y), lambda *args: a1.plot(*args, width=width, height=height, decimation='auto', out=sink)),
+    }
+
+
+def measure(setup: Callable, func: Callable, repeat: int) -> tuple:
+    """
+    Time a function, best of `repeat` runs, then measure its peak memory.
+    :param setup: returns the arguments, not timed
+    :param func:
+    :param repeat:
+    :return: seconds and peak bytes allocated
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = setup()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(sizes: list, canvases: list, repeat: int, only: Optional[list] = None) -> list:
+    """
+    Run every stage for every data size and canvas size.
+    :param sizes:
+    :param canvases: 'WIDTHxHEIGHT' strings
+    :param repeat:
+    :param only: stage names to run, all when None
+    :return:
+    """
+    results = []
+    with open(os.devnull, 'w') as sink:
+        for n in sizes:
+            x, y = gen_data(n)
+            for canvas in canvases:
+                width, height = map(int, canvas.split('x'))
+                for stage, (setup, func) in stages(x, y, width, height, sink).items():
+                    if only and stage not in only:
+                        continue
+                    seconds, peak = measure(setup, func, repeat)
+                    results.append(dict(
+                        stage=stage, n=n, width=width, height=height,
+                        seconds=seconds, peak_bytes=peak,
+                    ))
+                    print(f'{stage:>18} n={n:<9} {canvas:>7} {seconds * 1e3:10.3f} ms', file=sys.stderr)
+    return results
+
+
+def _key(result: dict) -> tuple:
+    return result['stage'], result['n'], result['width'], result['height']
+
+
+COLUMNS: list = [
+    ('stage', 18, lambda r: r['stage']),
+    ('n', 9, lambda r: r['n']),
+    ('canvas', 8, lambda r: f"{r['width']:>4}x{r['height']:<3}"),
+    ('time ms', 10, lambda r: f"{r['seconds'] * 1e3:.3f}"),
+    ('peak MiB', 9, lambda r: f"{r['peak_bytes'] / 2 ** 20:.2f}"),
+]
+
+
+def _add_arguments(parser) -> None:
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of data points')
+    parser.add_argument('--canvases', nargs='+', default=CANVASES, help='canvas sizes as WIDTHxHEIGHT')
+    parser.add_argument('--stages', nargs='+', help='only run these stages')
+
+
+def main(argv: Optional[list] = None) -> int:
+    return bench.main(
+        argv, __doc__, BASELINE, _add_arguments,
+        lambda args: run(args.sizes, args.canvases, args.repeat, args.stages),
+        _key, COLUMNS, MIN_DELTA,
+    )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
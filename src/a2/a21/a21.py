@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 """Assignment 2 Part 1"""
 
-from typing import IO
+import gzip
+from typing import IO, Iterable, Optional
+from itertools import islice
 from collections import namedtuple
 from typing import NamedTuple
 
@@ -9,25 +11,76 @@ from typing import NamedTuple
 class HtmlDoc:
     """an html document"""
     TAB: str = "   "  # HTML indentation tab (default: three spaces)
-
-    def __init__(self, file_name: str, window_title: str) -> None:
+    BUFFER_SIZE: int = 1 << 20  # characters buffered before writing to the file
+    BATCH_LINES: int = 4096  # lines joined at once by write_lines
+    GZIP_SUFFIXES: tuple = (".gz", ".svgz")  # file names compressed by default
+    GZIP_LEVEL: int = 6  # gzip compression level (1 fastest to 9 smallest)
+
+    def __init__(
+        self,
+        file_name: str,
+        window_title: str,
+        buffer_size: int = BUFFER_SIZE,
+        binary: bool = False,
+        compress: Optional[bool] = None,
+    ) -> None:
+        """
+        initialize an html document
+        :param file_name:
+        :param window_title:
+        :param buffer_size: characters to buffer before writing to the file
+        :param binary: write UTF-8 bytes to a file opened in binary mode
+        :param compress: gzip the output as it is written, defaults to whether
+            the file name ends with one of GZIP_SUFFIXES
+        """
         self.__fnam: str = file_name
         self.__wintitle: str = window_title
-        self.fd: IO[str] = self.open_html_file()
+        self.__buffer_size: int = buffer_size
+        if compress is None:
+            compress = file_name.endswith(HtmlDoc.GZIP_SUFFIXES)
+        self.__compress: bool = compress
+        self.__binary: bool = binary or compress
+        self.__fragments: list = []
+        self.__buffered: int = 0
+        self.fd: IO = self.open_html_file()
 
     def generate_html_file(self) -> None:
         """write an empty html document"""
         self.write_html_head()
         self.write_html_tail()
 
-    def open_html_file(self) -> IO[str]:
+    def open_html_file(self) -> IO:
         """open the html document"""
-        return open(self.__fnam, "w")
+        if self.__compress:
+            # a fixed timestamp keeps the compressed output reproducible
+            return gzip.GzipFile(self.__fnam, "wb", HtmlDoc.GZIP_LEVEL, mtime=0)
+        return open(self.__fnam, "wb" if self.__binary else "w")
 
     def close_html_file(self) -> None:
         """close the html document"""
+        self.flush()
         self.fd.close()
 
+    def flush(self) -> None:
+        """write the buffered output to the file"""
+        if not self.__fragments:
+            return
+        text: str = "".join(self.__fragments)
+        self.fd.write(text.encode("utf-8") if self.__binary else text)
+        self.__fragments.clear()
+        self.__buffered = 0
+
+    def __write(self, text: str) -> None:
+        """
+        buffer text, flushing once the buffer is full
+        :param text:
+        :return:
+        """
+        self.__fragments.append(text)
+        self.__buffered += len(text)
+        if self.__buffered >= self.__buffer_size:
+            self.flush()
+
     def __write_html_comment(self, t: int, com: str) -> None:
         """
         write a comment in the html document
@@ -36,7 +89,7 @@ class HtmlDoc:
         :return:
         """
         ts: str = HtmlDoc.TAB * t
-        self.fd.write(f"{ts}<!--{com}-->\n")
+        self.__write(f"{ts}<!--{com}-->\n")
 
     def write_html_line(self, t: int, line: str) -> None:
         """
@@ -46,7 +99,23 @@ class HtmlDoc:
         :return:
         """
         ts: str = HtmlDoc.TAB * t
-        self.fd.write(f"{ts}{line}\n")
+        self.__write(f"{ts}{line}\n")
+
+    def write_lines(self, t: int, lines: Iterable[str]) -> None:
+        """
+        write many lines with the same indentation in the html document
+        :param t:
+        :param lines:
+        :return:
+        """
+        ts: str = HtmlDoc.TAB * t
+        sep: str = f"\n{ts}"
+        lines = iter(lines)
+        while True:
+            batch: list = list(islice(lines, HtmlDoc.BATCH_LINES))
+            if not batch:
+                break
+            self.__write(f"{ts}{sep.join(batch)}\n")
 
     def write_html_head(self) -> None:
         """write the html header"""
@@ -79,8 +148,7 @@ class SvgCanvas:
         :return:
         """
         hd.write_html_line(t, f'<svg height="{self.__h}" width="{self.__w}">')
-        for figure in figures:
-            figure.draw_shape_line(hd, t * 2)
+        hd.write_lines(t * 2, (figure.shape_line() for figure in figures))
 
         hd.write_html_line(t, f'</svg>')
 
@@ -120,6 +188,15 @@ class Circle(Shape):
         super().__init__(point, color, op)
         self.__rad: int = rad
 
+    def shape_line(self) -> str:
+        """
+        format the svg element of a circle
+        :return:
+        """
+        line1: str = f'<circle cx="{self.x}" cy="{self.y}" r="{self.__rad}" '
+        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></circle>'
+        return line1 + line2
+
     def draw_shape_line(self, hd: HtmlDoc, t: int) -> None:
         """
         draw a circle
@@ -127,9 +204,7 @@ class Circle(Shape):
         :param t:
         :return:
         """
-        line1: str = f'<circle cx="{self.x}" cy="{self.y}" r="{self.__rad}" '
-        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></circle>'
-        hd.write_html_line(t, line1 + line2)
+        hd.write_html_line(t, self.shape_line())
 
 
 class Rectangle(Shape):
@@ -147,6 +222,15 @@ class Rectangle(Shape):
         self.__width: int = width
         self.__height: int = height
 
+    def shape_line(self) -> str:
+        """
+        format the svg element of a rectangle
+        :return:
+        """
+        line1: str = f'<rect x="{self.x}" y="{self.y}" width="{self.__width}" height="{self.__height}" '
+        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></rect>'
+        return line1 + line2
+
     def draw_shape_line(self, hd: HtmlDoc, t: int) -> None:
         """
         draw a rectangle
@@ -154,9 +238,7 @@ class Rectangle(Shape):
         :param t:
         :return:
         """
-        line1: str = f'<rect x="{self.x}" y="{self.y}" width="{self.__width}" height="{self.__height}" '
-        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></rect>'
-        hd.write_html_line(t, line1 + line2)
+        hd.write_html_line(t, self.shape_line())
 
 
 class Ellipse(Shape):
@@ -174,6 +256,15 @@ class Ellipse(Shape):
         self.__rx: int = rx
         self.__ry: int = ry
 
+    def shape_line(self) -> str:
+        """
+        format the svg element of an ellipse
+        :return:
+        """
+        line1: str = f'<ellipse cx="{self.x}" cy="{self.y}" rx="{self.__rx}" ry="{self.__ry}" '
+        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></ellipse>'
+        return line1 + line2
+
     def draw_shape_line(self, hd: HtmlDoc, t: int) -> None:
         """
         draw an ellipse
@@ -181,9 +272,7 @@ class Ellipse(Shape):
         :param t:
         :return:
         """
-        line1: str = f'<ellipse cx="{self.x}" cy="{self.y}" rx="{self.__rx}" ry="{self.__ry}" '
-        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></ellipse>'
-        hd.write_html_line(t, line1 + line2)
+        hd.write_html_line(t, self.shape_line())
 
 
 def main() -> None:
@@ -1,9 +1,17 @@
 #!/usr/bin/env python
 """Assignment 2 Part 2"""
+import io
 from random import randint, uniform
 from dataclasses import dataclass
-from collections import namedtuple
-from typing import NamedTuple
+from collections import namedtuple, deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+import numpy as np
+
+
+# the ranges of some attributes of an ArtConfig as arrays, see ArtConfig.compile
+Ranges: NamedTuple = namedtuple('Ranges', 'names low high floats')
 
 
 @dataclass
@@ -28,9 +36,21 @@ class ArtConfig:
     def set_attr(self, name: str, value: tuple):
         setattr(self, name, value)
 
+    def compile(self, names: Iterable[str]) -> Ranges:
+        """
+        collect the ranges of attributes once, to generate many values at a time
+        :param names: attribute names
+        :return: the names, the low and high ends of their ranges, and which ranges
+            are of floats, i.e. end at most at 1
+        """
+        names = tuple(names)
+        bounds = np.array([self.get_attr(name) for name in names], dtype=np.float64).reshape(-1, 2)
+        return Ranges(names, bounds[:, 0], bounds[:, 1], bounds[:, 1] <= 1)
+
 
 class GenRandom:
     """a random number generator"""
+    BLOCK_SIZE: int = 1 << 12  # rows of a stream drawn from the same child generator, see gen_rows
 
     @classmethod
     def gen_int_in_range(cls, a: int, b: int) -> int:
@@ -52,67 +72,215 @@ class GenRandom:
         """
         return round(uniform(a, b), 1)
 
+    @classmethod
+    def gen_columns(cls, rng: np.random.Generator, ranges: Ranges, n: int) -> dict:
+        """
+        generate n values of every attribute at once, integers in [low, high]
+        and floats in [low, high) rounded like gen_float_in_range
+        :param rng:
+        :param ranges: see ArtConfig.compile
+        :param n:
+        :return: attribute name -> array of values
+        """
+        ints = ~ranges.floats
+        floats = ranges.floats
+        columns = {}
+        if ints.any():
+            values = rng.integers(
+                ranges.low[ints].astype(np.int64), ranges.high[ints].astype(np.int64), (n, int(ints.sum())),
+                endpoint=True,
+            )
+            columns.update(zip([name for name, f in zip(ranges.names, floats) if not f], values.T))
+        if floats.any():
+            values = np.round(rng.uniform(ranges.low[floats], ranges.high[floats], (n, int(floats.sum()))), 1)
+            columns.update(zip([name for name, f in zip(ranges.names, floats) if f], values.T))
+        return columns
+
+    @classmethod
+    def gen_rows(cls, seed: int, ranges: Ranges, first: int, last: int) -> dict:
+        """
+        generate rows [first, last) of the stream of a master seed. Every block of
+        BLOCK_SIZE rows comes from its own child generator, spawned from the seed
+        sequence of the master seed, so any slicing of the stream into chunks or
+        workers gives the same rows.
+        :param seed: master seed
+        :param ranges: see ArtConfig.compile
+        :param first:
+        :param last:
+        :return: attribute name -> array of values
+        """
+        blocks = []
+        for block in range(first // cls.BLOCK_SIZE, -(-last // cls.BLOCK_SIZE)):
+            rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+            columns = cls.gen_columns(rng, ranges, cls.BLOCK_SIZE)
+            start = max(first - block * cls.BLOCK_SIZE, 0)
+            stop = min(last - block * cls.BLOCK_SIZE, cls.BLOCK_SIZE)
+            blocks.append({name: values[start:stop] for name, values in columns.items()})
+        if len(blocks) == 1:
+            return blocks[0]
+        return {name: np.concatenate([columns[name] for columns in blocks]) for name in ranges.names}
+
 
 Canvas: NamedTuple = namedtuple('Canvas', 'w h')
 
 
+class TableWriter:
+    """a fixed-width text table written to a file a chunk of rows at a time"""
+    WIDTH: int = 6  # characters per field, values are right aligned
+    def __init__(self, fd: IO, cols: list, width: int = WIDTH):
+        """
+        initialize a table writer, which writes nothing until write_header
+        :param fd: text file
+        :param cols: column names, the first column is the row number
+        :param width: characters per field
+        """
+        self.fd = fd
+        self.cols = cols
+        self.width = width
+        self.header = False
+        self.rows = 0
+
+    @classmethod
+    def format_rows(cls, cols: list, columns: dict, first: int, width: int = WIDTH) -> str:
+        """
+        format a chunk of rows column by column, every distinct value of a column once
+        :param cols: column names, the first column is the row number
+        :param columns: column name -> array of values, for every other column
+        :param first: number of the first row
+        :param width: characters per field
+        :return: the rows, each one starting with a newline
+        """
+        num_rows = len(columns[cols[1]])
+        field = f'{{:>{width}}}'
+        cells = [list(map(f'\n{field}'.format, range(first, first + num_rows)))]
+        for col in cols[1:]:
+            values, inverse = np.unique(columns[col], return_inverse=True)
+            strings = np.array([field.format(str(val)) for val in values.tolist()], dtype=object)
+            cells.append(strings[inverse].tolist())
+        return ''.join(chain.from_iterable(zip(*cells)))
+
+    def write_header(self) -> None:
+        """
+        write the header line, once before any row
+        :return:
+        """
+        assert not self.header and not self.rows
+        self.header = True
+        self.fd.write(''.join(f'{str(col):>{self.width}}' for col in self.cols))
+        self.fd.flush()
+
+    def write_rows(self, columns: dict) -> None:
+        """
+        append a chunk of rows, numbered after the rows already written
+        :param columns: see format_rows
+        :return:
+        """
+        text = self.format_rows(self.cols, columns, self.rows, self.width)
+        self.write_text(text, len(columns[self.cols[1]]))
+
+    def write_text(self, text: str, num_rows: int) -> None:
+        """
+        append a chunk of rows already formatted by format_rows, e.g. in a worker process
+        :param text:
+        :param num_rows: rows in the text
+        :return:
+        """
+        assert self.header
+        self.fd.write(text)
+        self.fd.flush()
+        self.rows += num_rows
+
+
 class SvgTable:
     """a svg table"""
     COLS: list = [
         'SHA', 'X', 'Y', 'RAD', 'RX', 'RY',
         'W', 'H', 'R', 'G', 'B', 'OP',
     ]
-    def __init__(self, canvas: Canvas, num_rows: int):
+    CHUNK_ROWS: int = 1 << 16  # rows created at once by write_table
+    def __init__(self, canvas: Canvas, num_rows: int, seed: Optional[int] = None):
         """
         initialize an svg table
         :param canvas:
         :param num_rows:
+        :param seed: master seed of the random stream of the table, random if None
         """
         self.canvas = canvas
         self.num_rows = num_rows
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
 
         self.art_config = ArtConfig()
         self.art_config.set_attr('X', tuple((0, self.canvas.w)))
         self.art_config.set_attr('Y', tuple((0, self.canvas.h)))
+        self.ranges = self.art_config.compile(self.COLS)
 
-    def create_table(self) -> str:
+    def create_rows(self, first: int, last: int) -> str:
+        """
+        create rows [first, last) of the table, the same whatever the other rows are
+        :param first:
+        :param last:
+        :return: the rows, each one starting with a newline
+        """
+        columns = GenRandom.gen_rows(self.seed, self.ranges, first, last)
+        return TableWriter.format_rows(['CNT'] + self.COLS, columns, first)
+
+    def __iter_chunks(self, processes: int, chunk_rows: int) -> Iterator[tuple]:
+        """
+        create the chunks of rows in order, in worker processes if more than one
+        :param processes:
+        :param chunk_rows:
+        :return: the text and number of rows of every chunk
+        """
+        bounds = [(first, min(first + chunk_rows, self.num_rows)) for first in range(0, self.num_rows, chunk_rows)]
+        if processes <= 1:
+            for first, last in bounds:
+                yield self.create_rows(first, last), last - first
+            return
+        with ProcessPoolExecutor(processes) as pool:
+            # only a few chunks are in flight, so memory doesn't grow with num_rows
+            pending = deque()
+            for first, last in bounds:
+                pending.append((pool.submit(self.create_rows, first, last), last - first))
+                if len(pending) > 2 * processes:
+                    future, num_rows = pending.popleft()
+                    yield future.result(), num_rows
+            for future, num_rows in pending:
+                yield future.result(), num_rows
+
+    def write_table(self, fd: IO, processes: int = 1, chunk_rows: int = CHUNK_ROWS) -> None:
+        """
+        write the table to a file as its rows are created, the same whatever
+        the number of processes and chunk size
+        :param fd: text file
+        :param processes: worker processes creating the chunks of rows
+        :param chunk_rows: rows per chunk
+        :return:
+        """
+        writer = TableWriter(fd, ['CNT'] + self.COLS)
+        writer.write_header()
+        for text, num_rows in self.__iter_chunks(processes, chunk_rows):
+            writer.write_text(text, num_rows)
+
+    def create_table(self, processes: int = 1, chunk_rows: int = CHUNK_ROWS) -> str:
         """
         create a table
+        :param processes: see write_table
+        :param chunk_rows: see write_table
         :return:
         """
-        def _create_row(row: list) -> str:
-            """
-            create a row
-            :param row:
-            :return:
-            """
-            str_row = [f"{str(val):>6}" for val in row]
-            return f"".join(str_row)
-
-        header = _create_row(['CNT'] + self.COLS)
-        table = [header]
-        for row_idx in range(self.num_rows):
-            row = [row_idx]
-            for col in self.COLS:
-                start, end = self.art_config.get_attr(col)
-                if end <= 1:
-                    row.append(GenRandom.gen_float_in_range(start, end))
-                else:
-                    row.append(GenRandom.gen_int_in_range(start, end))
-            table.append(_create_row(row))
-        return '\n'.join(table)
+        fd = io.StringIO()
+        self.write_table(fd, processes, chunk_rows)
+        return fd.getvalue()
 
 
 def main():
-    table = SvgTable(
-        canvas=Canvas(500, 300),
-        num_rows=10,
-    ).create_table()
-
     with open('a22.txt', 'w') as f:
-        f.write(table)
+        SvgTable(
+            canvas=Canvas(500, 300),
+            num_rows=10,
+        ).write_table(f)
 
 
 if __name__ == '__main__':
     print(__doc__)
-    main()
\ No newline at end of file
+    main()
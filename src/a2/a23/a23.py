@@ -1,34 +1,202 @@
 #!/usr/bin/env python
 """Assignment 2 Part 3"""
 
-from typing import IO, NamedTuple
-from collections import namedtuple
+import os
+import json
+import gzip
+import base64
+import zlib
+import struct
+import time
+import shutil
+import hashlib
+import tempfile
+import argparse
+from typing import IO, Callable, NamedTuple, Iterable, Iterator, Optional, Tuple
+from string import Formatter
+from itertools import islice, chain, repeat
+from collections import namedtuple, deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
 from random import randint, uniform
 from dataclasses import dataclass
+import numpy as np
+
+
+class Profiler:
+    """wall time, calls, shapes and bytes of the stages of the pipeline"""
+    ENV: str = "A23_PROFILE"  # profile every run when this environment variable is set
+
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        initialize a profiler, which records nothing unless enabled
+        :param enabled:
+        """
+        self.enabled: bool = enabled
+        self.stages: dict = {}  # stage -> [calls, seconds, shapes, bytes]
+        self.events: list = []  # every call, as chrome trace events
+
+    def start(self) -> float:
+        """
+        get the start time of a stage
+        :return:
+        """
+        return time.perf_counter() if self.enabled else 0.0
+
+    def record(self, stage: str, start: float, shapes: int = 0, nbytes: int = 0) -> None:
+        """
+        record a call of a stage
+        :param stage:
+        :param start: see start
+        :param shapes: shapes processed
+        :param nbytes: bytes written
+        :return:
+        """
+        if not self.enabled:
+            return
+        seconds: float = time.perf_counter() - start
+        totals: list = self.stages.setdefault(stage, [0, 0.0, 0, 0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += shapes
+        totals[3] += nbytes
+        self.events.append(dict(
+            name=stage, ph="X", ts=start * 1e6, dur=seconds * 1e6, pid=os.getpid(), tid=0,
+            args=dict(shapes=shapes, bytes=nbytes),
+        ))
+
+    def take(self) -> Optional[dict]:
+        """
+        remove the records, to send them from a worker process
+        :return: None when disabled
+        """
+        if not self.enabled:
+            return None
+        records: dict = dict(stages=self.stages, events=self.events)
+        self.stages, self.events = {}, []
+        return records
+
+    def merge(self, records: Optional[dict]) -> None:
+        """
+        add the records taken from another profiler
+        :param records:
+        :return:
+        """
+        if records is None:
+            return
+        for stage, (calls, seconds, shapes, nbytes) in records["stages"].items():
+            totals: list = self.stages.setdefault(stage, [0, 0.0, 0, 0])
+            totals[0] += calls
+            totals[1] += seconds
+            totals[2] += shapes
+            totals[3] += nbytes
+        self.events += records["events"]
+
+    def summary(self) -> str:
+        """
+        format the stages as a table, slowest first
+        :return:
+        """
+        header: str = f"{'stage':>10} {'calls':>8} {'seconds':>9} {'shapes':>10} {'shapes/s':>11} {'MiB':>9}"
+        lines: list = [header, "-" * len(header)]
+        for stage, (calls, seconds, shapes, nbytes) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            rate: str = f"{shapes / seconds:.0f}" if shapes and seconds else "-"
+            lines.append(f"{stage:>10} {calls:>8} {seconds:>9.3f} {shapes:>10} {rate:>11} {nbytes / 2 ** 20:>9.2f}")
+        return "\n".join(lines)
+
+    def write_trace(self, file_name: str) -> None:
+        """
+        write the calls as a chrome trace (chrome://tracing, Perfetto) with the stage totals
+        :param file_name:
+        :return:
+        """
+        stages: dict = {
+            stage: dict(calls=calls, seconds=seconds, shapes=shapes, bytes=nbytes)
+            for stage, (calls, seconds, shapes, nbytes) in self.stages.items()
+        }
+        with open(file_name, "w") as fd:
+            json.dump(dict(traceEvents=self.events, stages=stages), fd)
+
+
+PROFILER: Profiler = Profiler(enabled=bool(os.environ.get(Profiler.ENV)))
 
 
 class HtmlDoc:
     """an html document"""
     TAB: str = "   "  # HTML indentation tab (default: three spaces)
+    BUFFER_SIZE: int = 1 << 20  # characters buffered before writing to the file
+    BATCH_LINES: int = 4096  # lines joined at once by write_lines
+    GZIP_SUFFIXES: tuple = (".gz", ".svgz")  # file names compressed by default
+    GZIP_LEVEL: int = 6  # gzip compression level (1 fastest to 9 smallest)
 
-    def __init__(self, file_name: str, window_title: str) -> None:
+    def __init__(
+        self,
+        file_name: str,
+        window_title: str,
+        buffer_size: int = BUFFER_SIZE,
+        binary: bool = False,
+        compress: Optional[bool] = None,
+    ) -> None:
+        """
+        initialize an html document
+        :param file_name:
+        :param window_title:
+        :param buffer_size: characters to buffer before writing to the file
+        :param binary: write UTF-8 bytes to a file opened in binary mode
+        :param compress: gzip the output as it is written, defaults to whether
+            the file name ends with one of GZIP_SUFFIXES
+        """
         self.__fnam: str = file_name
         self.__wintitle: str = window_title
-        self.fd: IO[str] = self.open_html_file()
+        self.__buffer_size: int = buffer_size
+        if compress is None:
+            compress = file_name.endswith(HtmlDoc.GZIP_SUFFIXES)
+        self.__compress: bool = compress
+        self.__binary: bool = binary or compress
+        self.__fragments: list = []
+        self.__buffered: int = 0
+        self.fd: IO = self.open_html_file()
 
     def generate_html_file(self) -> None:
         """write an empty html document"""
         self.write_html_head()
         self.write_html_tail()
 
-    def open_html_file(self) -> IO[str]:
+    def open_html_file(self) -> IO:
         """open the html document"""
-        return open(self.__fnam, "w")
+        if self.__compress:
+            # a fixed timestamp keeps the compressed output reproducible
+            return gzip.GzipFile(self.__fnam, "wb", HtmlDoc.GZIP_LEVEL, mtime=0)
+        return open(self.__fnam, "wb" if self.__binary else "w")
 
     def close_html_file(self) -> None:
         """close the html document"""
+        self.flush()
         self.fd.close()
 
+    def flush(self) -> None:
+        """write the buffered output to the file"""
+        if not self.__fragments:
+            return
+        t0: float = PROFILER.start()
+        text: str = "".join(self.__fragments)
+        data = text.encode("utf-8") if self.__binary else text
+        self.fd.write(data)
+        self.__fragments.clear()
+        self.__buffered = 0
+        PROFILER.record("write", t0, nbytes=len(data))
+
+    def __write(self, text: str) -> None:
+        """
+        buffer text, flushing once the buffer is full
+        :param text:
+        :return:
+        """
+        self.__fragments.append(text)
+        self.__buffered += len(text)
+        if self.__buffered >= self.__buffer_size:
+            self.flush()
+
     def __write_html_comment(self, t: int, com: str) -> None:
         """
         write a comment in the html document
@@ -37,7 +205,7 @@ class HtmlDoc:
         :return:
         """
         ts: str = HtmlDoc.TAB * t
-        self.fd.write(f"{ts}<!--{com}-->\n")
+        self.__write(f"{ts}<!--{com}-->\n")
 
     def write_html_line(self, t: int, line: str) -> None:
         """
@@ -47,7 +215,23 @@ class HtmlDoc:
         :return:
         """
         ts: str = HtmlDoc.TAB * t
-        self.fd.write(f"{ts}{line}\n")
+        self.__write(f"{ts}{line}\n")
+
+    def write_lines(self, t: int, lines: Iterable[str]) -> None:
+        """
+        write many lines with the same indentation in the html document
+        :param t:
+        :param lines:
+        :return:
+        """
+        ts: str = HtmlDoc.TAB * t
+        sep: str = f"\n{ts}"
+        lines = iter(lines)
+        while True:
+            batch: list = list(islice(lines, HtmlDoc.BATCH_LINES))
+            if not batch:
+                break
+            self.__write(f"{ts}{sep.join(batch)}\n")
 
     def write_html_head(self) -> None:
         """write the html header"""
@@ -63,6 +247,35 @@ class HtmlDoc:
         self.write_html_line(0, "</html>")
 
 
+class SvgDoc(HtmlDoc):
+    """a standalone svg document, for .svg and .svgz files"""
+    SUFFIXES: tuple = (".svg", ".svgz")
+
+    def __init__(self, file_name: str, window_title: str, w: int, h: int, **kwargs) -> None:
+        """
+        initialize an svg document
+        :param file_name:
+        :param window_title:
+        :param w: width of the document
+        :param h: height of the document
+        :param kwargs: see HtmlDoc
+        """
+        self.__title: str = window_title
+        self.__w: int = w
+        self.__h: int = h
+        super().__init__(file_name, window_title, **kwargs)
+
+    def write_html_head(self) -> None:
+        """write the svg root element, the canvases are nested svg elements"""
+        self.write_html_line(0, '<?xml version="1.0" encoding="UTF-8"?>')
+        self.write_html_line(0, f'<svg xmlns="http://www.w3.org/2000/svg" height="{self.__h}" width="{self.__w}">')
+        self.write_html_line(1, f"<title>{self.__title}</title>")
+
+    def write_html_tail(self) -> None:
+        """close the svg root element"""
+        self.write_html_line(0, "</svg>")
+
+
 class SvgCanvas:
     """an svg canvas"""
     def __init__(self, tlx: int, tly: int, w: int, h: int) -> None:
@@ -71,18 +284,102 @@ class SvgCanvas:
         self.__w: int = w
         self.__h: int = h
 
-    def gen_art(self, hd: HtmlDoc, figures: list, t: int):
+    def gen_art(
+        self,
+        hd: HtmlDoc,
+        figures: list,
+        t: int,
+        cull: str = 'none',
+        styles: Optional['SvgStyles'] = None,
+        lod: Optional['LevelOfDetail'] = None,
+    ) -> 'CullStats':
         """
-        generate an art on the svg canvas
+        generate an art on the svg canvas, which shows the area of size
+        (w, h) whose top left corner is (tlx, tly)
         :param hd:
-        :param figures:
+        :param figures: shape objects, a ShapeColumns, or an iterable of ShapeColumns
+            chunks which is consumed one chunk at a time
         :param t:
-        :return:
+        :param cull: one of CULL_MODES, 'viewport' drops the shapes outside the
+            canvas, 'occlusion' also drops the shapes hidden under later opaque
+            shapes of the same chunk; needs ShapeColumns
+        :param styles: write compact unindented svg, whose fills share the css
+            classes of these styles; needs ShapeColumns, use one SvgStyles per document
+        :param lod: draw the small or crowded shapes of every chunk in raster
+            images, see ShapeColumns.lod_lines; needs ShapeColumns
+        :return: the number of shapes culled and rasterized
         """
-        hd.write_html_line(t, f'<svg height="{self.__h}" width="{self.__w}">')
-        for figure in figures:
-            figure.draw_shape_line(hd, t * 2)
+        assert cull in CULL_MODES
+        if styles is not None:
+            t = 0
+        viewbox: str = ''
+        if self.__tlx or self.__tly:
+            viewbox = f' viewBox="{self.__tlx} {self.__tly} {self.__w} {self.__h}"'
+        hd.write_html_line(t, f'<svg height="{self.__h}" width="{self.__w}"{viewbox}>')
+        culled: list = []
+        hd.write_lines(t * 2, self.__shape_lines(figures, cull, styles, lod, culled))
         hd.write_html_line(t, f'</svg>')
+        return CullStats(*map(sum, zip(CullStats(0, 0, 0), *culled)))
+
+    def __shape_lines(
+        self,
+        figures,
+        cull: str,
+        styles: Optional['SvgStyles'],
+        lod: Optional['LevelOfDetail'],
+        culled: list,
+    ) -> Iterable[str]:
+        """
+        format the svg elements of the figures lazily
+        :param figures: shape objects, a ShapeColumns, or an iterable of ShapeColumns chunks
+        :param cull:
+        :param styles:
+        :param lod:
+        :param culled: gets the CullStats of every chunk
+        :return:
+        """
+        if isinstance(figures, ShapeColumns):
+            figures = (figures,)
+        figures = iter(figures)
+        first = next(figures, None)
+        if first is None:
+            return iter(())
+        figures = chain((first,), figures)
+        if not isinstance(first, ShapeColumns):
+            assert cull == 'none' and styles is None and lod is None, \
+                'only ShapeColumns can be culled, compact or rasterized'
+            return (figure.shape_line() for figure in figures)
+        return chain.from_iterable(self.__chunk_lines(chunk, cull, styles, lod, culled) for chunk in figures)
+
+    def __chunk_lines(
+        self,
+        chunk: 'ShapeColumns',
+        cull: str,
+        styles: Optional['SvgStyles'],
+        lod: Optional['LevelOfDetail'],
+        culled: list,
+    ) -> Iterable[str]:
+        """
+        cull a chunk of shapes and format its svg elements
+        :param chunk:
+        :param cull:
+        :param styles:
+        :param lod:
+        :param culled: gets the CullStats of the chunk
+        :return:
+        """
+        if cull == 'none' and lod is None:
+            return chunk.shape_lines(styles=styles)
+        viewport: tuple = (self.__tlx, self.__tly, self.__tlx + self.__w, self.__tly + self.__h)
+        stats: CullStats = CullStats(len(chunk), 0, 0)
+        if cull != 'none':
+            chunk, stats = chunk.cull(viewport, occlusion=cull == 'occlusion')
+        if lod is None:
+            culled.append(stats)
+            return chunk.shape_lines(styles=styles)
+        lines, rasterized = chunk.lod_lines(viewport, lod, styles)
+        culled.append(stats._replace(rasterized=rasterized.rasterized, images=rasterized.images))
+        return lines
 
 
 # shorten shape parameters using namedtuples
@@ -125,6 +422,15 @@ class Circle(Shape):
         super().__init__(point, color, op)
         self.__rad: int = rad
 
+    def shape_line(self) -> str:
+        """
+        format the svg element of a circle
+        :return:
+        """
+        line1: str = f'<circle cx="{self.x}" cy="{self.y}" r="{self.__rad}" '
+        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></circle>'
+        return line1 + line2
+
     def draw_shape_line(self, hd: HtmlDoc, t: int) -> None:
         """
         draw a circle
@@ -132,9 +438,7 @@ class Circle(Shape):
         :param t:
         :return:
         """
-        line1: str = f'<circle cx="{self.x}" cy="{self.y}" r="{self.__rad}" '
-        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></circle>'
-        hd.write_html_line(t, line1 + line2)
+        hd.write_html_line(t, self.shape_line())
 
 
 class Rectangle(Shape):
@@ -152,6 +456,15 @@ class Rectangle(Shape):
         self.__width: int = width
         self.__height: int = height
 
+    def shape_line(self) -> str:
+        """
+        format the svg element of a rectangle
+        :return:
+        """
+        line1: str = f'<rect x="{self.x}" y="{self.y}" width="{self.__width}" height="{self.__height}" '
+        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></rect>'
+        return line1 + line2
+
     def draw_shape_line(self, hd: HtmlDoc, t: int) -> None:
         """
         draw a rectangle
@@ -159,9 +472,7 @@ class Rectangle(Shape):
         :param t:
         :return:
         """
-        line1: str = f'<rect x="{self.x}" y="{self.y}" width="{self.__width}" height="{self.__height}" '
-        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></rect>'
-        hd.write_html_line(t, line1 + line2)
+        hd.write_html_line(t, self.shape_line())
 
 
 class Ellipse(Shape):
@@ -179,6 +490,15 @@ class Ellipse(Shape):
         self.__rx: int = rx
         self.__ry: int = ry
 
+    def shape_line(self) -> str:
+        """
+        format the svg element of an ellipse
+        :return:
+        """
+        line1: str = f'<ellipse cx="{self.x}" cy="{self.y}" rx="{self.__rx}" ry="{self.__ry}" '
+        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></ellipse>'
+        return line1 + line2
+
     def draw_shape_line(self, hd: HtmlDoc, t: int) -> None:
         """
         draw an ellipse
@@ -186,9 +506,7 @@ class Ellipse(Shape):
         :param t:
         :return:
         """
-        line1: str = f'<ellipse cx="{self.x}" cy="{self.y}" rx="{self.__rx}" ry="{self.__ry}" '
-        line2: str = f'fill="rgb({self.red}, {self.green}, {self.blue})" fill-opacity="{self.op}"></ellipse>'
-        hd.write_html_line(t, line1 + line2)
+        hd.write_html_line(t, self.shape_line())
 
 
 class ShapeFactory:
@@ -224,6 +542,10 @@ class ShapeFactory:
             )
 
 
+# the ranges of some attributes of an ArtConfig as arrays, see ArtConfig.compile
+Ranges: NamedTuple = namedtuple('Ranges', 'names low high floats')
+
+
 @dataclass
 class ArtConfig:
     """art configuration"""
@@ -246,9 +568,21 @@ class ArtConfig:
     def set_attr(self, name: str, value: tuple):
         setattr(self, name.upper(), value)
 
+    def compile(self, names: Iterable[str]) -> Ranges:
+        """
+        collect the ranges of attributes once, to generate many values at a time
+        :param names: attribute names
+        :return: the names, the low and high ends of their ranges, and which ranges
+            are of floats, i.e. end at most at 1 like in Batch.gen_specs
+        """
+        names = tuple(names)
+        bounds: np.ndarray = np.array([self.get_attr(name) for name in names], dtype=np.float64).reshape(-1, 2)
+        return Ranges(names, bounds[:, 0], bounds[:, 1], bounds[:, 1] <= 1)
+
 
 class GenRandom:
     """a random number generator"""
+    BLOCK_SIZE: int = 1 << 12  # rows of a stream drawn from the same child generator, see gen_rows
 
     @classmethod
     def gen_int_in_range(cls, a: int, b: int) -> int:
@@ -270,66 +604,1391 @@ class GenRandom:
         """
         return round(uniform(a, b), 1)
 
+    @classmethod
+    def gen_columns(cls, rng: np.random.Generator, ranges: Ranges, n: int) -> dict:
+        """
+        generate n values of every attribute at once, integers in [low, high]
+        and floats in [low, high) rounded like gen_float_in_range
+        :param rng:
+        :param ranges: see ArtConfig.compile
+        :param n:
+        :return: attribute name -> array of values
+        """
+        ints: np.ndarray = ~ranges.floats
+        floats: np.ndarray = ranges.floats
+        columns: dict = {}
+        if ints.any():
+            values: np.ndarray = rng.integers(
+                ranges.low[ints].astype(np.int64), ranges.high[ints].astype(np.int64), (n, int(ints.sum())),
+                endpoint=True,
+            )
+            columns.update(zip([name for name, f in zip(ranges.names, floats) if not f], values.T))
+        if floats.any():
+            values = np.round(rng.uniform(ranges.low[floats], ranges.high[floats], (n, int(floats.sum()))), 1)
+            columns.update(zip([name for name, f in zip(ranges.names, floats) if f], values.T))
+        return columns
+
+    @classmethod
+    def gen_rows(cls, seed: int, ranges: Ranges, first: int, last: int) -> dict:
+        """
+        generate rows [first, last) of the stream of a master seed. Every block of
+        BLOCK_SIZE rows comes from its own child generator, spawned from the seed
+        sequence of the master seed, so any slicing of the stream into chunks,
+        shards or workers gives the same rows.
+        :param seed: master seed
+        :param ranges: see ArtConfig.compile
+        :param first:
+        :param last:
+        :return: attribute name -> array of values
+        """
+        blocks: list = []
+        for block in range(first // cls.BLOCK_SIZE, -(-last // cls.BLOCK_SIZE)):
+            rng: np.random.Generator = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+            columns: dict = cls.gen_columns(rng, ranges, cls.BLOCK_SIZE)
+            start: int = max(first - block * cls.BLOCK_SIZE, 0)
+            stop: int = min(last - block * cls.BLOCK_SIZE, cls.BLOCK_SIZE)
+            blocks.append({name: values[start:stop] for name, values in columns.items()})
+        if len(blocks) == 1:
+            return blocks[0]
+        return {name: np.concatenate([columns[name] for columns in blocks]) for name in ranges.names}
+
 
 Canvas: NamedTuple = namedtuple('Canvas', 'w h')
 Specs: NamedTuple = namedtuple('Props', 'shape x y rad rx ry width height red green blue op')
+# shapes looked at by the culling and level of detail of gen_art, how many were dropped
+# outside the canvas or hidden, and how many were drawn in how many raster images
+CullStats: NamedTuple = namedtuple('CullStats', 'shapes outside hidden rasterized images', defaults=(0, 0))
+CULL_MODES: tuple = ('none', 'viewport', 'occlusion')
+# shapes that fit in a `tile` of the canvas and are smaller than `min_size`, or are more than
+# `max_shapes` in their tile, are drawn in a raster image of the tile with `scale` pixels per unit
+LevelOfDetail: NamedTuple = namedtuple('LevelOfDetail', 'tile min_size max_shapes scale', defaults=(64, 1, 32, 1.0))
+
+
+class SvgStyles:
+    """css classes shared by the compact shapes of a document"""
+    HEX: np.ndarray = np.array([f'{i:02x}' for i in range(256)], dtype=object)
+    DIGITS: np.ndarray = np.array(list('0123456789abcdef'), dtype=object)
+
+    def __init__(self) -> None:
+        """initialize the styles of a document, without any class"""
+        self.__keys: np.ndarray = np.empty(0, dtype=np.int64)  # sorted fills that have a class
+        self.__names: np.ndarray = np.empty(0, dtype=object)  # class names of the fills
+        self.__ops: dict = {}  # opacity -> its number, packed in the fills
+        self.__inline_ops: list = []  # fill-opacity attribute of every opacity number
+        self.__css_ops: list = []  # fill-opacity declaration of every opacity number
+
+    @staticmethod
+    def short_number(value: float) -> str:
+        """
+        format a number without a leading zero or a trailing .0
+        :param value:
+        :return:
+
+        >>> SvgStyles.short_number(0.5), SvgStyles.short_number(1.0), SvgStyles.short_number(0.0)
+        ('.5', '1', '0')
+        """
+        text: str = str(value)
+        if text.endswith('.0'):
+            text = text[:-2]
+        if text.startswith('0.'):
+            text = text[1:]
+        return text
+
+    @classmethod
+    def hex_colors(cls, red: np.ndarray, green: np.ndarray, blue: np.ndarray) -> np.ndarray:
+        """
+        format colors as #rrggbb, or #rgb when every channel repeats its digit
+        :param red:
+        :param green:
+        :param blue:
+        :return:
+
+        >>> SvgStyles.hex_colors(np.array([255, 255]), np.array([0, 1]), np.array([170, 2])).tolist()
+        ['#f0a', '#ff0102']
+        """
+        colors: np.ndarray = '#' + cls.HEX[red] + cls.HEX[green] + cls.HEX[blue]
+        short: np.ndarray = (red % 17 == 0) & (green % 17 == 0) & (blue % 17 == 0)
+        colors[short] = '#' + cls.DIGITS[red[short] // 17] + cls.DIGITS[green[short] // 17] + cls.DIGITS[blue[short] // 17]
+        return colors
+
+    def paint(self, chunk: np.ndarray) -> Tuple[np.ndarray, Optional[str]]:
+        """
+        get the fill attributes of a chunk of shapes, fills used more than
+        once become css classes, which the rest of the document reuses
+        :param chunk: records of ShapeColumns.DTYPE
+        :return: the attributes of every shape, and a style element with the
+            new classes if there are any
+        """
+        # number the opacities, to pack a fill into one integer
+        ops, op_idx = np.unique(chunk['op'], return_inverse=True)
+        for op in ops.tolist():
+            if op not in self.__ops:
+                self.__ops[op] = len(self.__ops)
+                text: str = self.short_number(op)
+                self.__inline_ops.append('' if text == '1' else f' fill-opacity="{text}"')
+                self.__css_ops.append('' if text == '1' else f';fill-opacity:{text}')
+        op_ids: np.ndarray = np.array([self.__ops[op] for op in ops.tolist()], dtype=np.int64)
+        rgb: np.ndarray = (chunk['red'].astype(np.int64) << 16) | (chunk['green'].astype(np.int64) << 8) | chunk['blue']
+        fills, inverse, counts = np.unique(rgb << 32 | op_ids[op_idx], return_inverse=True, return_counts=True)
+
+        # fills with a class already, and fills used more than once by this chunk
+        pos: np.ndarray = np.searchsorted(self.__keys, fills)
+        known: np.ndarray = pos < len(self.__keys)
+        known[known] = self.__keys[pos[known]] == fills[known]
+        new: np.ndarray = ~known & (counts > 1)
+        names: np.ndarray = np.array([f'c{i:x}' for i in range(len(self.__names), len(self.__names) + new.sum())],
+                                     dtype=object)
+
+        colors: np.ndarray = self.hex_colors((fills >> 48) & 255, (fills >> 40) & 255, (fills >> 32) & 255)
+        opacity: np.ndarray = fills & 0xffffffff
+        attrs: np.ndarray = ' fill="' + colors + '"' + np.array(self.__inline_ops, dtype=object)[opacity]
+        attrs[known] = ' class="' + self.__names[pos[known]] + '"'
+        attrs[new] = ' class="' + names + '"'
+
+        style: Optional[str] = None
+        if len(names):
+            rules: np.ndarray = '.' + names + '{fill:' + colors[new] + np.array(self.__css_ops, dtype=object)[opacity[new]] + '}'
+            style = f"<style>{''.join(rules.tolist())}</style>"
+            order: np.ndarray = np.argsort(np.concatenate((self.__keys, fills[new])))
+            self.__keys = np.concatenate((self.__keys, fills[new]))[order]
+            self.__names = np.concatenate((self.__names, names))[order]
+        return attrs[inverse], style
+
+
+class ShapeColumns:
+    """a column-oriented collection of shapes"""
+    # one record per shape, 40 bytes instead of a shape object and its __dict__
+    DTYPE: np.dtype = np.dtype([
+        ('shape', np.uint8),
+        ('x', np.int32),
+        ('y', np.int32),
+        ('rad', np.int32),
+        ('rx', np.int32),
+        ('ry', np.int32),
+        ('width', np.int32),
+        ('height', np.int32),
+        ('red', np.uint8),
+        ('green', np.uint8),
+        ('blue', np.uint8),
+        ('op', np.float64),
+    ])
+    # svg element of every shape code, like ShapeFactory larger codes are ellipses
+    ELEMENTS: tuple = (
+        '<circle cx="{x}" cy="{y}" r="{rad}" fill="rgb({red}, {green}, {blue})" fill-opacity="{op}"></circle>',
+        '<rect x="{x}" y="{y}" width="{width}" height="{height}" '
+        'fill="rgb({red}, {green}, {blue})" fill-opacity="{op}"></rect>',
+        '<ellipse cx="{x}" cy="{y}" rx="{rx}" ry="{ry}" '
+        'fill="rgb({red}, {green}, {blue})" fill-opacity="{op}"></ellipse>',
+    )
+    # the same elements for compact output, `paint` holds the fill attributes
+    COMPACT_ELEMENTS: tuple = (
+        '<circle cx="{x}" cy="{y}" r="{rad}"{paint}/>',
+        '<rect x="{x}" y="{y}" width="{width}" height="{height}"{paint}/>',
+        '<ellipse cx="{x}" cy="{y}" rx="{rx}" ry="{ry}"{paint}/>',
+    )
+    CHUNK_SIZE: int = 1 << 16  # shapes formatted at once by shape_lines
+    LOD_OVERLAP: float = 0.125  # fraction of a tile that its raster image spills over its neighbours
+    CULL_GRID: int = 200  # grid cells along the longer side of the viewport, for occlusion culling
+    AA_MARGIN: float = 1.0  # pixels at the edge of an opaque shape that may be antialiased
+
+    def __init__(self, data: np.ndarray) -> None:
+        """
+        initialize a collection of shapes
+        :param data: structured array with the fields of DTYPE
+        """
+        self.data: np.ndarray = np.asarray(data, dtype=ShapeColumns.DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @classmethod
+    def from_specs(cls, specs: Iterable[Specs]) -> 'ShapeColumns':
+        """
+        collect shape specs without creating a shape object per spec
+        :param specs:
+        :return:
+        """
+        return cls(np.fromiter(specs, dtype=cls.DTYPE))
+
+    @classmethod
+    def rechunk(cls, chunks: Iterable['ShapeColumns'], chunk_size: int = CHUNK_SIZE) -> Iterator['ShapeColumns']:
+        """
+        split or merge chunks of shapes into chunks of chunk_size shapes, the last one
+        excepted. Culling, level of detail and css classes work a chunk at a time, so
+        this fixes the output whatever the chunks come from.
+        :param chunks:
+        :param chunk_size:
+        :return:
+        """
+        pending: list = []  # records not yielded yet, fewer than chunk_size
+        buffered: int = 0
+        for chunk in chunks:
+            if not buffered and len(chunk) == chunk_size:
+                yield chunk
+                continue
+            pending.append(chunk.data)
+            buffered += len(chunk)
+            if buffered < chunk_size:
+                continue
+            data: np.ndarray = np.concatenate(pending)
+            full: int = len(data) - len(data) % chunk_size
+            for first in range(0, full, chunk_size):
+                yield cls(data[first:first + chunk_size])
+            pending, buffered = [data[full:]], len(data) - full
+        if buffered:
+            yield cls(np.concatenate(pending))
+
+    @classmethod
+    def from_columns(cls, **columns) -> 'ShapeColumns':
+        """
+        collect shapes from one array per column, missing columns are zeros
+        :param columns: arrays of the same length, named after the fields of Specs
+        :return:
+        """
+        length: int = len(next(iter(columns.values())))
+        data: np.ndarray = np.zeros(length, dtype=cls.DTYPE)
+        for name, column in columns.items():
+            data[name] = column
+        return cls(data)
+
+    def bounds(self) -> tuple:
+        """
+        bounding boxes of the shapes
+        :return: arrays of the left, top, right and bottom edges
+        """
+        kinds: np.ndarray = np.minimum(self.data['shape'], len(ShapeColumns.ELEMENTS) - 1)
+        x: np.ndarray = self.data['x'].astype(np.float64)
+        y: np.ndarray = self.data['y'].astype(np.float64)
+        # rectangles are anchored at their top left corner, the others at their center
+        rect: np.ndarray = kinds == 1
+        rx: np.ndarray = np.choose(kinds, (self.data['rad'], self.data['width'], self.data['rx']))
+        ry: np.ndarray = np.choose(kinds, (self.data['rad'], self.data['height'], self.data['ry']))
+        return np.where(rect, x, x - rx), np.where(rect, y, y - ry), x + rx, y + ry
+
+    def cull(self, viewport: tuple, occlusion: bool = False) -> tuple:
+        """
+        drop the shapes outside a viewport and, optionally, the shapes hidden
+        under later opaque shapes
+        :param viewport: left, top, right and bottom edges
+        :param occlusion: also drop the hidden shapes
+        :return: the kept shapes and their CullStats
+        """
+        t0: float = PROFILER.start()
+        left, top, right, bottom = self.bounds()
+        vl, vt, vr, vb = viewport
+        visible: np.ndarray = (right >= vl) & (left <= vr) & (bottom >= vt) & (top <= vb)
+        hidden: np.ndarray = np.zeros(len(self), dtype=bool)
+        if occlusion:
+            idx: np.ndarray = np.flatnonzero(visible)
+            hidden[idx] = self.__last_cover(viewport, idx, left, top, right, bottom) > idx
+        keep: np.ndarray = visible & ~hidden
+        stats: CullStats = CullStats(len(self), len(self) - int(np.count_nonzero(visible)), int(np.count_nonzero(hidden)))
+        PROFILER.record('cull', t0, shapes=len(self))
+        return ShapeColumns(self.data[keep]), stats
+
+    def __last_cover(
+        self,
+        viewport: tuple,
+        idx: np.ndarray,
+        left: np.ndarray,
+        top: np.ndarray,
+        right: np.ndarray,
+        bottom: np.ndarray,
+    ) -> np.ndarray:
+        """
+        find, for some shapes, the last opaque shape that is over them
+        everywhere. The viewport is split in a uniform grid, every opaque shape
+        marks the cells it covers entirely, and a shape is under the oldest mark
+        of the cells of its bounding box; a shape covered by a union of later
+        shapes counts as hidden too.
+        :param viewport:
+        :param idx: the shapes, inside the viewport
+        :param left:
+        :param top:
+        :param right:
+        :param bottom:
+        :return: index of the covering shape, -1 if none
+        """
+        vl, vt, vr, vb = viewport
+        cell: float = max(vr - vl, vb - vt, 1) / ShapeColumns.CULL_GRID
+        cols: int = max(int(np.ceil((vr - vl) / cell)), 1)
+        rows: int = max(int(np.ceil((vb - vt) / cell)), 1)
+
+        # the cells inside the largest rectangle inside every opaque shape, which
+        # is 1/sqrt(2) the size of the bounding box for circles and ellipses
+        opaque: np.ndarray = np.flatnonzero(self.data['op'] >= 1.0)
+        scale: np.ndarray = np.where(self.data['shape'][opaque] == 1, 0.5, np.sqrt(0.125))
+        cx, cy = (left[opaque] + right[opaque]) / 2, (top[opaque] + bottom[opaque]) / 2
+        hw = (right[opaque] - left[opaque]) * scale - ShapeColumns.AA_MARGIN
+        hh = (bottom[opaque] - top[opaque]) * scale - ShapeColumns.AA_MARGIN
+        c0 = np.clip(np.ceil((cx - hw - vl) / cell), 0, cols).astype(int)
+        c1 = np.clip(np.floor((cx + hw - vl) / cell), 0, cols).astype(int)
+        r0 = np.clip(np.ceil((cy - hh - vt) / cell), 0, rows).astype(int)
+        r1 = np.clip(np.floor((cy + hh - vt) / cell), 0, rows).astype(int)
+        some = (c0 < c1) & (r0 < r1)
+        cover: np.ndarray = np.full((rows, cols), -1, dtype=np.int64)
+        # in order, so that later shapes mark over earlier ones
+        for j, a0, a1, b0, b1 in zip(*(arr[some].tolist() for arr in (opaque, c0, c1, r0, r1))):
+            cover[b0:b1, a0:a1] = j
+
+        # the cells touched by every shape, inclusive
+        c0 = np.clip(np.floor((np.maximum(left[idx], vl) - vl) / cell), 0, cols - 1).astype(int)
+        c1 = np.clip(np.floor((np.minimum(right[idx], vr) - vl) / cell), 0, cols - 1).astype(int)
+        r0 = np.clip(np.floor((np.maximum(top[idx], vt) - vt) / cell), 0, rows - 1).astype(int)
+        r1 = np.clip(np.floor((np.minimum(bottom[idx], vb) - vt) / cell), 0, rows - 1).astype(int)
+        return ShapeColumns.__range_min(cover, r0, c0, r1, c1)
+
+    @staticmethod
+    def __range_min(grid: np.ndarray, r0: np.ndarray, c0: np.ndarray, r1: np.ndarray, c1: np.ndarray) -> np.ndarray:
+        """
+        minimum of many rectangles [r0, r1] x [c0, c1] of a grid, from a sparse
+        table of the minimums of its 2**a x 2**b blocks
+        :param grid:
+        :param r0:
+        :param c0:
+        :param r1:
+        :param c1:
+        :return:
+        """
+        rows, cols = grid.shape
+        table: np.ndarray = np.empty((rows.bit_length(), cols.bit_length(), rows, cols), dtype=grid.dtype)
+        table[0, 0] = grid
+        for b in range(1, cols.bit_length()):
+            half = 1 << (b - 1)
+            table[0, b, :, :cols - half] = np.minimum(table[0, b - 1, :, :cols - half], table[0, b - 1, :, half:])
+        for a in range(1, rows.bit_length()):
+            half = 1 << (a - 1)
+            table[a, :, :rows - half] = np.minimum(table[a - 1, :, :rows - half], table[a - 1, :, half:])
+
+        # two overlapping blocks per axis cover a rectangle
+        a: np.ndarray = np.frexp(r1 - r0 + 1)[1] - 1
+        b: np.ndarray = np.frexp(c1 - c0 + 1)[1] - 1
+        r2, c2 = r1 - (1 << a) + 1, c1 - (1 << b) + 1
+        return np.minimum.reduce([
+            table[a, b, r0, c0],
+            table[a, b, r2, c0],
+            table[a, b, r0, c2],
+            table[a, b, r2, c2],
+        ])
+
+    def lod_lines(
+        self,
+        viewport: tuple,
+        lod: 'LevelOfDetail',
+        styles: Optional[SvgStyles] = None,
+    ) -> Tuple[list, 'CullStats']:
+        """
+        format the svg elements of the shapes, except that the shapes which fit
+        in a tile of the viewport (give or take LOD_OVERLAP) and are either
+        smaller than lod.min_size or in a tile with more than lod.max_shapes
+        such shapes are drawn in raster images of their tile. An image is stacked
+        where its first shape was, and a new one is started whenever another shape
+        over the image of the tile comes in between, so the stacking order holds.
+        A shape left alone in its image stays a vector. The shapes of a blank image
+        are dropped, and are not counted as rasterized.
+        :param viewport: left, top, right and bottom edges
+        :param lod:
+        :param styles: see shape_lines
+        :return: the lines, and the number of shapes rasterized and images
+        """
+        t0: float = PROFILER.start()
+        left, top, right, bottom = self.bounds()
+        vl, vt, vr, vb = viewport
+        cols: int = max(int(np.ceil((vr - vl) / lod.tile)), 1)
+        rows: int = max(int(np.ceil((vb - vt) / lod.tile)), 1)
+        # a shape belongs to the tile of its center, the images overlap by a margin
+        # so that the small shapes across the edge of a tile fit in it too
+        pad: int = int(lod.tile * ShapeColumns.LOD_OVERLAP)
+        col: np.ndarray = ((left + right) / 2 - vl) // lod.tile
+        row: np.ndarray = ((top + bottom) / 2 - vt) // lod.tile
+        fits: np.ndarray = (
+            (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+            & (left >= vl + col * lod.tile - pad) & (right <= vl + (col + 1) * lod.tile + pad)
+            & (top >= vt + row * lod.tile - pad) & (bottom <= vt + (row + 1) * lod.tile + pad)
+        )
+        tiles: np.ndarray = np.where(fits, row * cols + col, 0).astype(int)
+        crowded: np.ndarray = np.bincount(tiles[fits], minlength=rows * cols) > lod.max_shapes
+        small: np.ndarray = np.maximum(right - left, bottom - top) < lod.min_size
+        rasterized: np.ndarray = fits & (small | crowded[tiles])
+        raster: np.ndarray = np.flatnonzero(rasterized)
+
+        # every shape over the image of a tile with rasterized shapes, in order per tile
+        c0: np.ndarray = np.maximum((left - vl - pad) // lod.tile, 0).astype(int)
+        c1: np.ndarray = np.minimum((right - vl + pad) // lod.tile, cols - 1).astype(int)
+        r0: np.ndarray = np.maximum((top - vt - pad) // lod.tile, 0).astype(int)
+        r1: np.ndarray = np.minimum((bottom - vt + pad) // lod.tile, rows - 1).astype(int)
+        width: np.ndarray = np.maximum(c1 - c0 + 1, 0)
+        counts: np.ndarray = width * np.maximum(r1 - r0 + 1, 0)
+        shapes: np.ndarray = np.repeat(np.arange(len(self)), counts)
+        offsets: np.ndarray = np.arange(len(shapes)) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = np.repeat(width, counts)
+        over: np.ndarray = (np.repeat(r0, counts) + offsets // width) * cols + np.repeat(c0, counts) + offsets % width
+        keep: np.ndarray = (np.bincount(tiles[raster], minlength=rows * cols) > 0)[over]
+        order: np.ndarray = np.argsort(over[keep], kind='stable')
+        shapes, over = shapes[keep][order], over[keep][order]
+        # a run of the rasterized shapes of a tile, without any other shape over its image in between
+        member: np.ndarray = rasterized[shapes] & (tiles[shapes] == over)
+        first: np.ndarray = member & ~np.concatenate(([False], member[:-1] & (over[1:] == over[:-1])))
+        runs: list = np.split(shapes[member], np.flatnonzero(first[member])[1:]) if member.any() else []
+
+        positions: list = []
+        images: list = []
+        imaged: list = [np.empty(0, dtype=int)]  # the rasterized shapes, with those of blank images
+        drawn: int = 0
+        size: int = lod.tile + 2 * pad
+        for run in runs:
+            if len(run) < 2:
+                continue
+            imaged.append(run)
+            tile_row, tile_col = divmod(int(tiles[run[0]]), cols)
+            tile_x, tile_y = vl + tile_col * lod.tile - pad, vt + tile_row * lod.tile - pad
+            # the image only covers the shapes of the run, within the image of the tile
+            run_shapes: ShapeColumns = ShapeColumns(self.data[run])
+            run_left, run_top, run_right, run_bottom = run_shapes.bounds()
+            x, y = max(int(np.floor(run_left.min())), tile_x), max(int(np.floor(run_top.min())), tile_y)
+            w: int = min(int(np.ceil(run_right.max())), tile_x + size) - x
+            h: int = min(int(np.ceil(run_bottom.max())), tile_y + size) - y
+            image: Raster = Raster(w, h, x, y, lod.scale, background=None)
+            image.draw(run_shapes)
+            pixels: np.ndarray = image.image()
+            if not pixels[..., 3].any():
+                continue
+            data: str = base64.b64encode(Raster.encode_png(pixels)).decode('ascii')
+            positions.append(run[0])
+            drawn += len(run)
+            images.append(f'<image x="{x}" y="{y}" width="{w}" height="{h}" '
+                          f'href="data:image/png;base64,{data}"/>')
+
+        PROFILER.record('lod', t0, shapes=len(self))
+
+        vector: np.ndarray = np.setdiff1d(np.arange(len(self)), np.concatenate(imaged), assume_unique=True)
+        # formatted as one chunk, so that a style element can only come before the shapes
+        lines: list = list(ShapeColumns(self.data[vector]).shape_lines(max(len(vector), 1), styles))
+        head: int = len(lines) - len(vector)
+        order: np.ndarray = np.argsort(np.concatenate((vector, np.array(positions, dtype=int))), kind='stable')
+        elements: np.ndarray = np.array(lines[head:] + images, dtype=object)[order]
+        return lines[:head] + elements.tolist(), CullStats(len(self), 0, 0, drawn, len(images))
+
+    def shape_lines(self, chunk_size: int = CHUNK_SIZE, styles: Optional[SvgStyles] = None) -> Iterable[str]:
+        """
+        format the svg elements of the shapes in order, a chunk at a time
+        :param chunk_size:
+        :param styles: format compact elements, which share the css classes of the styles
+        :return:
+        """
+        for start in range(0, len(self.data), chunk_size):
+            chunk: np.ndarray = self.data[start:start + chunk_size]
+            if styles is None:
+                t0: float = PROFILER.start()
+                lines: list = self.__format_chunk(chunk, ShapeColumns.ELEMENTS)
+                PROFILER.record('format', t0, shapes=len(chunk))
+                yield from lines
+                continue
+            t0 = PROFILER.start()
+            paint, style = styles.paint(chunk)
+            PROFILER.record('style', t0, shapes=len(chunk))
+            if style is not None:
+                yield style
+            t0 = PROFILER.start()
+            lines = self.__format_chunk(chunk, ShapeColumns.COMPACT_ELEMENTS, paint=paint)
+            PROFILER.record('format', t0, shapes=len(chunk))
+            yield from lines
+
+    @staticmethod
+    def __column_strings(column: np.ndarray) -> list:
+        """
+        format every value of a column like str(), converting each distinct value once
+        :param column:
+        :return:
+        """
+        if column.dtype.kind in 'iu' and len(column):
+            low, high = column.min().item(), column.max().item()
+            if high - low <= 4 * len(column):
+                table: np.ndarray = np.array([str(i) for i in range(low, high + 1)], dtype=object)
+                return table[column - low].tolist()
+        values, inverse = np.unique(column, return_inverse=True)
+        return np.array([str(value) for value in values.tolist()], dtype=object)[inverse].tolist()
+
+    @classmethod
+    def __format_chunk(cls, chunk: np.ndarray, elements: tuple, **strings: np.ndarray) -> list:
+        """
+        format the svg elements of a chunk, a column at a time per shape type
+        :param chunk:
+        :param elements: template of every shape type
+        :param strings: more fields of the templates, already formatted for every shape
+        :return:
+        """
+        kinds: np.ndarray = np.minimum(chunk['shape'], len(elements) - 1)
+        lines: np.ndarray = np.empty(len(chunk), dtype=object)
+        for kind, element in enumerate(elements):
+            idx: np.ndarray = np.flatnonzero(kinds == kind)
+            if not len(idx):
+                continue
+            rows: np.ndarray = chunk[idx]
+            # interleave the literal text of the element with its formatted columns
+            pieces: list = []
+            for text, field, _, _ in Formatter().parse(element + '\n'):
+                pieces.append(repeat(text))
+                if field in strings:
+                    pieces.append(strings[field][idx].tolist())
+                elif field is not None:
+                    pieces.append(cls.__column_strings(rows[field]))
+            text: str = ''.join(chain.from_iterable(zip(*pieces)))
+            # put the elements back in document order, which is their stacking order
+            lines[idx] = text.split('\n')[:-1]
+        return lines.tolist()
+
+
+class Raster:
+    """a raster image of shapes, composited with numpy"""
+    TILE: int = 16  # pixels per side of the tiles composited at once
+    PNG_LEVEL: int = 6  # zlib compression level of the png files
+
+    def __init__(
+        self,
+        w: int,
+        h: int,
+        tlx: int = 0,
+        tly: int = 0,
+        scale: float = 1.0,
+        background: Optional[Color] = Color(255, 255, 255),
+        supersample: int = 1,
+    ) -> None:
+        """
+        initialize an image of the area of size (w, h) whose top left corner
+        is (tlx, tly), like SvgCanvas
+        :param w:
+        :param h:
+        :param tlx:
+        :param tly:
+        :param scale: pixels per unit, below 1 for thumbnails
+        :param background: None for a transparent image
+        :param supersample: samples per pixel along each axis, for antialiasing
+        """
+        self.__tlx: int = tlx
+        self.__tly: int = tly
+        self.__scale: float = scale
+        self.__opaque: bool = background is not None
+        self.__supersample: int = supersample
+        self.__width: int = max(int(np.ceil(w * scale)), 1)
+        self.__height: int = max(int(np.ceil(h * scale)), 1)
+        # premultiplied color and alpha of every pixel
+        self.__color: np.ndarray = np.zeros((self.__height, self.__width, 3), dtype=np.float32)
+        self.__alpha: np.ndarray = np.zeros((self.__height, self.__width), dtype=np.float32)
+        if self.__opaque:
+            self.__color[:] = background
+            self.__alpha[:] = 1
+
+    def draw(self, shapes: 'ShapeColumns') -> None:
+        """
+        composite shapes over the image in order, a tile at a time
+        :param shapes:
+        :return:
+        """
+        t0: float = PROFILER.start()
+        tile: int = Raster.TILE
+        cols: int = -(-self.__width // tile)
+        rows: int = -(-self.__height // tile)
+        left, top, right, bottom = (
+            (edge - offset) * self.__scale
+            for edge, offset in zip(shapes.bounds(), (self.__tlx, self.__tly) * 2)
+        )
+        idx: np.ndarray = np.flatnonzero(
+            (right >= 0) & (left <= self.__width) & (bottom >= 0) & (top <= self.__height)
+        )
+        c0, c1 = (np.clip(edge[idx] // tile, 0, cols - 1).astype(int) for edge in (left, right))
+        r0, r1 = (np.clip(edge[idx] // tile, 0, rows - 1).astype(int) for edge in (top, bottom))
+
+        # every (tile, shape) pair, with the shapes of a tile in drawing order
+        per_row: np.ndarray = c1 - c0 + 1
+        counts: np.ndarray = per_row * (r1 - r0 + 1)
+        first: np.ndarray = np.repeat(np.cumsum(counts) - counts, counts)
+        k: np.ndarray = np.arange(counts.sum()) - first
+        owner: np.ndarray = np.repeat(np.arange(len(idx)), counts)
+        tiles: np.ndarray = (r0[owner] + k // per_row[owner]) * cols + c0[owner] + k % per_row[owner]
+        order: np.ndarray = np.argsort(tiles, kind='stable')
+        tiles, shape_idx = tiles[order], idx[owner[order]]
+        bounds: np.ndarray = np.flatnonzero(np.diff(tiles)) + 1
+        for first, last in zip(np.concatenate(([0], bounds)).tolist(), np.concatenate((bounds, [len(tiles)])).tolist()):
+            row, col = divmod(int(tiles[first]), cols)
+            self.__draw_tile(shapes.data[shape_idx[first:last]], row * tile, col * tile)
+        PROFILER.record('raster', t0, shapes=len(shapes))
+
+    def draw_all(self, chunks: Iterable['ShapeColumns']) -> Iterator['ShapeColumns']:
+        """
+        draw chunks of shapes as they pass through
+        :param chunks:
+        :return: the chunks
+        """
+        for chunk in chunks:
+            self.draw(chunk)
+            yield chunk
+
+    def __draw_tile(self, shapes: np.ndarray, y: int, x: int) -> None:
+        """
+        composite the shapes touching a tile over it
+        :param shapes: records of ShapeColumns.DTYPE, in drawing order
+        :param y: top pixel of the tile
+        :param x: left pixel of the tile
+        :return:
+        """
+        height: int = min(Raster.TILE, self.__height - y)
+        width: int = min(Raster.TILE, self.__width - x)
+        # the sample points of the tile pixels, in canvas units
+        n: int = self.__supersample
+        offsets: np.ndarray = (np.arange(n) + 0.5) / n
+        py: np.ndarray = ((y + np.arange(height)[:, None] + offsets).ravel() / self.__scale + self.__tly)[:, None]
+        px: np.ndarray = ((x + np.arange(width)[:, None] + offsets).ravel() / self.__scale + self.__tlx)[None, :]
+        py, px = py[None], px[None]
+
+        kinds: np.ndarray = np.minimum(shapes['shape'], 2)[:, None, None]
+        cx: np.ndarray = shapes['x'].astype(np.float32)[:, None, None]
+        cy: np.ndarray = shapes['y'].astype(np.float32)[:, None, None]
+        rx: np.ndarray = np.where(kinds == 0, shapes['rad'][:, None, None], shapes['rx'][:, None, None]).astype(np.float32)
+        ry: np.ndarray = np.where(kinds == 0, shapes['rad'][:, None, None], shapes['ry'][:, None, None]).astype(np.float32)
+        in_rect: np.ndarray = (
+            (px >= cx) & (px < cx + shapes['width'][:, None, None])
+            & (py >= cy) & (py < cy + shapes['height'][:, None, None])
+        )
+        in_ellipse: np.ndarray = ((px - cx) * ry) ** 2 + ((py - cy) * rx) ** 2 < (rx * ry) ** 2
+        inside: np.ndarray = np.where(kinds == 1, in_rect, in_ellipse)
+        coverage: np.ndarray = inside.reshape(len(shapes), height, n, width, n).mean(axis=(2, 4), dtype=np.float32)
+
+        # over operator of the whole stack: every shape is dimmed by the ones above it
+        alpha: np.ndarray = shapes['op'].astype(np.float32)[:, None] * coverage.reshape(len(shapes), -1)
+        above: np.ndarray = np.cumprod((1 - alpha)[::-1], axis=0)[::-1]
+        dimmed: np.ndarray = alpha * np.concatenate((above[1:], np.ones_like(above[:1])))
+        colors: np.ndarray = np.stack((shapes['red'], shapes['green'], shapes['blue']), axis=1).astype(np.float32)
+        color: np.ndarray = self.__color[y:y + height, x:x + width]
+        alpha_out: np.ndarray = self.__alpha[y:y + height, x:x + width]
+        color *= above[0].reshape(height, width, 1)
+        color += (dimmed.T @ colors).reshape(height, width, 3)
+        alpha_out *= above[0].reshape(height, width)
+        alpha_out += 1 - above[0].reshape(height, width)
+
+    def image(self) -> np.ndarray:
+        """
+        get the image
+        :return: uint8 RGB pixels, RGBA if the background is transparent
+        """
+        if self.__opaque:
+            return np.clip(np.rint(self.__color), 0, 255).astype(np.uint8)
+        alpha: np.ndarray = self.__alpha[..., None]
+        color: np.ndarray = np.divide(self.__color, alpha, out=np.zeros_like(self.__color), where=alpha > 0)
+        return np.clip(np.rint(np.concatenate((color, alpha * 255), axis=2)), 0, 255).astype(np.uint8)
+
+    def write_png(self, file_name: str) -> None:
+        """
+        write the image as a png file
+        :param file_name:
+        :return:
+        """
+        with open(file_name, 'wb') as fd:
+            fd.write(Raster.encode_png(self.image()))
+
+    @staticmethod
+    def encode_png(pixels: np.ndarray) -> bytes:
+        """
+        encode an image as png
+        :param pixels: uint8 RGB or RGBA
+        :return:
+        """
+        t0: float = PROFILER.start()
+        height, width, channels = pixels.shape
+        # every row starts with filter type 0 (none)
+        rows: np.ndarray = np.zeros((height, width * channels + 1), dtype=np.uint8)
+        rows[:, 1:] = pixels.reshape(height, -1)
+
+        def png_chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        header: bytes = struct.pack('>IIBBBBB', width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+        png: bytes = b''.join((
+            b'\x89PNG\r\n\x1a\n',
+            png_chunk(b'IHDR', header),
+            png_chunk(b'IDAT', zlib.compress(rows.tobytes(), Raster.PNG_LEVEL)),
+            png_chunk(b'IEND', b''),
+        ))
+        PROFILER.record('png', t0, nbytes=len(png))
+        return png
 
 
 class Batch:
     """create a batch of shapes"""
-    def __init__(self, canvas: Canvas, num_shapes: int):
+    PROPS: tuple = (
+        'shape', 'x', 'y', 'rad', 'rx', 'ry',
+        'width', 'height', 'red', 'green', 'blue', 'op',
+    )
+
+    def __init__(self, canvas: Canvas, num_shapes: int, seed: Optional[int] = None):
         """
         initialize a batch of shapes
         :param canvas:
         :param num_shapes:
+        :param seed: master seed of the random stream of the batch, random if None
         """
         self.canvas = canvas
         self.num_shapes = num_shapes
+        self.seed: int = np.random.SeedSequence().entropy if seed is None else seed
 
         self.art_config = ArtConfig()
         self.art_config.set_attr('x', tuple((0, self.canvas.w)))
         self.art_config.set_attr('y', tuple((0, self.canvas.h)))
+        self.ranges: Ranges = self.art_config.compile(Batch.PROPS)
+
+    def gen_specs(self) -> Iterator[Specs]:
+        """
+        generate the specs of the shapes one at a time
+        :return:
+        """
+        for chunk in self.iter_chunks():
+            yield from map(Specs._make, chunk.data.tolist())
 
     def create_batch(self):
         """
         create batch
         :return:
         """
-        props: list = [
-            'shape', 'x', 'y', 'rad', 'rx', 'ry',
-            'width', 'height', 'red', 'green', 'blue', 'op',
-        ]
-        shapes = []
-        for shape_idx in range(self.num_shapes):
-            shape = []
-            for prop in props:
-                start, end = self.art_config.get_attr(prop)
-                if end <= 1:
-                    value = GenRandom.gen_float_in_range(start, end)
-                else:
-                    value = GenRandom.gen_int_in_range(start, end)
-                shape.append(value)
-            shapes.append(Specs(*shape))
-        return shapes
-
-
-def main() -> None:
-    canvas: NamedTuple = Canvas(800, 500)
-    for i in range(1, 4):
-        hd: HtmlDoc = HtmlDoc(f"a2-3{i}.html", f"MyPart{i}")
-        hd.open_html_file()
-        hd.write_html_head()
-
-        batch: Batch = Batch(canvas, 2000)
-        shape_specs: list = batch.create_batch()
-        shapes: list = []
-        for specs in shape_specs:
-            shapes.append(ShapeFactory().from_specs(specs))
-        cn: SvgCanvas = SvgCanvas(tlx=0, tly=0, w=canvas.w, h=canvas.h)
-        cn.gen_art(hd, shapes, 1)
-
-        hd.write_html_tail()
-        hd.close_html_file()
+        return list(self.gen_specs())
+
+    def iter_chunks(self, chunk_size: int = ShapeColumns.CHUNK_SIZE) -> Iterator[ShapeColumns]:
+        """
+        create the batch lazily in chunks, so that only one chunk is in memory at a time
+        :param chunk_size: shapes per chunk
+        :return:
+        """
+        for first in range(0, self.num_shapes, chunk_size):
+            yield self.gen_chunk(first, min(first + chunk_size, self.num_shapes))
+
+    def gen_chunk(self, first: int, last: int) -> ShapeColumns:
+        """
+        create shapes [first, last) of the batch, the same whatever the other chunks are
+        :param first:
+        :param last:
+        :return:
+        """
+        t0: float = PROFILER.start()
+        columns: dict = GenRandom.gen_rows(self.seed, self.ranges, first, last)
+        PROFILER.record('generate', t0, shapes=last - first)
+        t0 = PROFILER.start()
+        chunk: ShapeColumns = ShapeColumns.from_columns(**columns)
+        PROFILER.record('build', t0, shapes=last - first)
+        return chunk
+
+
+class SpecFile:
+    """a binary file of shape specs, one typed column after the other, read through a memory map"""
+    MAGIC: bytes = b'A23SPECS'
+    VERSION: int = 2
+    ALIGN: int = 64  # byte alignment of the header end and of every column
+    # stored type of every column of Specs, opacities are stored in tenths like gen_float_in_range rounds them
+    COLUMNS: tuple = (
+        ('shape', '<u1'), ('x', '<u2'), ('y', '<u2'), ('rad', '<u2'), ('rx', '<u2'), ('ry', '<u2'),
+        ('width', '<u2'), ('height', '<u2'), ('red', '<u1'), ('green', '<u1'), ('blue', '<u1'), ('op', '<u1'),
+    )
+    OP_SCALE: int = 10
+
+    def __init__(self, file_name: str) -> None:
+        """
+        open a spec file, the columns are views of the memory map and nothing is read until used
+        :param file_name:
+        """
+        self.file_name: str = file_name
+        self.buffer: np.memmap = np.memmap(file_name, np.uint8, 'r')
+        prefix: bytes = bytes(self.buffer[:len(SpecFile.MAGIC) + 8])
+        if not prefix.startswith(SpecFile.MAGIC):
+            raise ValueError(f'{file_name} is not a spec file')
+        version, size = struct.unpack('<II', prefix[len(SpecFile.MAGIC):])
+        if version != SpecFile.VERSION:
+            raise ValueError(f'{file_name} has version {version}, not {SpecFile.VERSION}')
+        header: dict = json.loads(bytes(self.buffer[len(prefix):len(prefix) + size]))
+        self.canvas: Canvas = Canvas(*header['canvas'])
+        self.num_shapes: int = header['num_shapes']
+        self.seed: int = header['seed']
+        self.art_config: ArtConfig = ArtConfig(**{name: tuple(value) for name, value in header['art_config'].items()})
+        self.columns: dict = {
+            name: self.buffer[offset:offset + self.num_shapes * np.dtype(dtype).itemsize].view(dtype)
+            for name, dtype, offset in header['columns']
+        }
+
+    def __len__(self) -> int:
+        return self.num_shapes
+
+    def matches(self, canvas: Canvas, num_shapes: int, art_config: ArtConfig, seed: int) -> bool:
+        """
+        check whether the file holds the shapes generated from these parameters
+        :param canvas:
+        :param num_shapes:
+        :param art_config:
+        :param seed:
+        :return:
+        """
+        return (self.canvas, self.num_shapes, self.art_config, self.seed) == (tuple(canvas), num_shapes, art_config, seed)
+
+    @staticmethod
+    def layout(num_shapes: int, header_size: int) -> tuple:
+        """
+        place the columns after the header
+        :param num_shapes:
+        :param header_size: bytes of the magic, version, size and json header
+        :return: name, type and offset of every column, and the file size
+        """
+        def align(offset: int) -> int:
+            return -(-offset // SpecFile.ALIGN) * SpecFile.ALIGN
+
+        offset: int = align(header_size)
+        columns: list = []
+        for name, dtype in SpecFile.COLUMNS:
+            columns.append((name, dtype, offset))
+            offset = align(offset + num_shapes * np.dtype(dtype).itemsize)
+        return columns, offset
+
+    @staticmethod
+    def write_chunks(
+        file_name: str,
+        canvas: Canvas,
+        art_config: ArtConfig,
+        num_shapes: int,
+        seed: int,
+        chunks: Iterable[ShapeColumns],
+    ) -> Iterator[ShapeColumns]:
+        """
+        write chunks of shapes to a spec file as they pass through, the file is
+        written under a temporary name and only appears once it is complete
+        :param file_name:
+        :param canvas:
+        :param art_config: the ranges the shapes were generated from
+        :param num_shapes: shapes in all the chunks
+        :param seed: the master seed the shapes were generated from
+        :param chunks:
+        :return: the chunks
+        """
+        # the header size depends on the column offsets, which depend on the header size
+        header: dict = dict(canvas=list(canvas), num_shapes=num_shapes, seed=seed,
+                            art_config={name: list(value) for name, value in vars(art_config).items()})
+        columns, size = SpecFile.layout(num_shapes, 0)
+        data: bytes = b''
+        while True:
+            header['columns'] = columns
+            data = json.dumps(header).encode('utf-8')
+            prefix: bytes = SpecFile.MAGIC + struct.pack('<II', SpecFile.VERSION, len(data))
+            placed, size = SpecFile.layout(num_shapes, len(prefix) + len(data))
+            if placed == columns:
+                break
+            columns = placed
+
+        temp_name: str = f'{file_name}.{os.getpid()}.tmp'
+        buffer: np.memmap = np.memmap(temp_name, np.uint8, 'w+', shape=(size,))
+        # not set on any exception, including GeneratorExit when the chunks are not all consumed
+        written: bool = False
+        try:
+            buffer[:len(prefix) + len(data)] = np.frombuffer(prefix + data, np.uint8)
+            first: int = 0
+            for chunk in chunks:
+                last: int = first + len(chunk)
+                if last > num_shapes:
+                    raise ValueError(f'more than {num_shapes} shapes for {file_name}')
+                for name, dtype, offset in columns:
+                    values: np.ndarray = chunk.data[name]
+                    if name == 'op':
+                        values = np.rint(values * SpecFile.OP_SCALE)
+                    info: np.iinfo = np.iinfo(dtype)
+                    if len(values) and (values.min() < info.min or values.max() > info.max):
+                        raise ValueError(f'{name} does not fit in {dtype}')
+                    itemsize: int = np.dtype(dtype).itemsize
+                    buffer[offset + first * itemsize:offset + last * itemsize].view(dtype)[:] = values
+                first = last
+                yield chunk
+            if first != num_shapes:
+                raise ValueError(f'{first} shapes instead of {num_shapes} for {file_name}')
+            buffer.flush()
+            written = True
+        finally:
+            del buffer
+            if written:
+                os.replace(temp_name, file_name)
+            else:
+                os.remove(temp_name)
+
+    def gen_chunk(self, first: int, last: int) -> ShapeColumns:
+        """
+        read shapes [first, last)
+        :param first:
+        :param last:
+        :return:
+        """
+        t0: float = PROFILER.start()
+        columns: dict = {name: values[first:last] for name, values in self.columns.items()}
+        columns['op'] = columns['op'] / SpecFile.OP_SCALE
+        chunk: ShapeColumns = ShapeColumns.from_columns(**columns)
+        PROFILER.record('read', t0, shapes=last - first)
+        return chunk
+
+    def iter_chunks(self, chunk_size: int = ShapeColumns.CHUNK_SIZE) -> Iterator[ShapeColumns]:
+        """
+        read the shapes in chunks, so that only one chunk is in memory at a time
+        :param chunk_size: shapes per chunk
+        :return:
+        """
+        for first in range(0, self.num_shapes, chunk_size):
+            yield self.gen_chunk(first, min(first + chunk_size, self.num_shapes))
+
+
+# a document to generate, `seed` seeds its random stream, `cull` is one of CULL_MODES,
+# `compact` writes compact svg, `png_scale` also renders a png image at that scale,
+# `lod` is the LevelOfDetail of the svg, if any, `specs` is the SpecFile its shapes are read from,
+# or written to when it doesn't exist yet
+DocJob: NamedTuple = namedtuple(
+    'DocJob',
+    'file_name title canvas num_shapes seed cull compact png_scale lod specs',
+    defaults=('none', False, None, None, None),
+)
+# shapes per document shard, the output doesn't depend on the shard boundaries
+SHARD_SIZE: int = 1 << 16
+Throughput: NamedTuple = namedtuple('Throughput', 'documents shapes seconds outside hidden rasterized images')
+
+
+def stream_seed(seed: int, *key: int) -> int:
+    """
+    derive the seed of an independent random stream from a master seed
+    :param seed: master seed
+    :param key: position of the stream, e.g. the document and shard index
+    :return:
+    """
+    state: np.ndarray = np.random.SeedSequence(seed, spawn_key=key).generate_state(4)
+    return int.from_bytes(state.tobytes(), 'little')
+
+
+def open_document(job: DocJob) -> HtmlDoc:
+    """
+    open the document of a job, an SvgDoc for .svg and .svgz file names,
+    gzip compressed for .gz and .svgz ones
+    :param job:
+    :return:
+    """
+    if job.file_name.endswith(SvgDoc.SUFFIXES):
+        return SvgDoc(job.file_name, job.title, job.canvas.w, job.canvas.h)
+    return HtmlDoc(job.file_name, job.title)
+
+
+def document_chunks(job: DocJob, batch: Batch, chunks: Callable[[], Iterable[ShapeColumns]]) -> Iterable[ShapeColumns]:
+    """
+    get the shapes of a document from its spec file if it exists and was written
+    for the same canvas, shape count, ranges and seed, otherwise generate them,
+    and write them to its spec file if it has one
+    :param job:
+    :param batch: the batch of the document
+    :param chunks: generates the shapes, only called when they are not read
+    :return:
+    """
+    if job.specs and os.path.exists(job.specs):
+        specs: SpecFile = SpecFile(job.specs)
+        if specs.matches(job.canvas, job.num_shapes, batch.art_config, job.seed):
+            return specs.iter_chunks()
+        # written for another job, so generated again
+    if job.specs:
+        return SpecFile.write_chunks(job.specs, job.canvas, batch.art_config, job.num_shapes, job.seed, chunks())
+    return chunks()
+
+
+def write_document(job: DocJob) -> CullStats:
+    """
+    generate a document in one go from its own random stream
+    :param job:
+    :return: number of shapes culled
+    """
+    batch: Batch = Batch(job.canvas, job.num_shapes, job.seed)
+    return write_chunks(job, document_chunks(job, batch, batch.iter_chunks))
+
+
+def write_chunks(job: DocJob, chunks: Iterable[ShapeColumns]) -> CullStats:
+    """
+    write the document of a job, and its png image if it has a png_scale
+    :param job:
+    :param chunks: the shapes of the document, consumed one chunk at a time, and
+        rechunked at fixed offsets of the document
+    :return: number of shapes culled
+    """
+    t0: float = PROFILER.start()
+    chunks = ShapeColumns.rechunk(chunks)
+    raster: Optional[Raster] = None
+    if job.png_scale:
+        raster = Raster(job.canvas.w, job.canvas.h, scale=job.png_scale)
+        chunks = raster.draw_all(chunks)
+    hd: HtmlDoc = open_document(job)
+    hd.write_html_head()
+    cn: SvgCanvas = SvgCanvas(tlx=0, tly=0, w=job.canvas.w, h=job.canvas.h)
+    styles: Optional[SvgStyles] = SvgStyles() if job.compact else None
+    stats: CullStats = cn.gen_art(hd, chunks, 1, job.cull, styles, job.lod)
+    hd.write_html_tail()
+    hd.close_html_file()
+    if raster is not None:
+        raster.write_png(png_file_name(job))
+    PROFILER.record('document', t0, shapes=job.num_shapes)
+    return stats
+
+
+def png_file_name(job: DocJob) -> str:
+    """
+    get the file name of the png image of a job, next to its document
+    :param job:
+    :return:
+    """
+    root, ext = os.path.splitext(job.file_name)
+    if ext == ".gz":
+        root = os.path.splitext(root)[0]
+    return root + ".png"
+
+
+def create_shard(canvas: Canvas, seed: int, first: int, last: int) -> ShapeColumns:
+    """
+    create shapes [first, last) of a document
+    :param canvas:
+    :param seed: master seed of the document
+    :param first:
+    :param last:
+    :return:
+    """
+    return Batch(canvas, last, seed).gen_chunk(first, last)
+
+
+def _init_worker(profile: bool) -> None:
+    """
+    set up a worker process
+    :param profile: enable the profiler
+    :return:
+    """
+    PROFILER.enabled = profile
+
+
+def _run_document(job: DocJob) -> Tuple[CullStats, Optional[dict]]:
+    """
+    write a document in a worker process
+    :param job:
+    :return: see write_document, and the profiler records of the worker
+    """
+    return write_document(job), PROFILER.take()
+
+
+def _run_shard(canvas: Canvas, seed: int, first: int, last: int) -> Tuple[ShapeColumns, Optional[dict]]:
+    """
+    create a shard in a worker process
+    :param canvas:
+    :param seed:
+    :param first:
+    :param last:
+    :return: see create_shard, and the profiler records of the worker
+    """
+    return create_shard(canvas, seed, first, last), PROFILER.take()
+
+
+def _merge_profiles(results: Iterable[tuple]) -> Iterator:
+    """
+    add the profiler records of workers to the profiler of this process
+    :param results: (value, records) pairs
+    :return: the values
+    """
+    for value, records in results:
+        PROFILER.merge(records)
+        yield value
+
+
+def write_sharded_document(
+    job: DocJob,
+    pool: Optional[ProcessPoolExecutor] = None,
+    processes: int = 1,
+    shard_size: int = SHARD_SIZE,
+) -> CullStats:
+    """
+    generate a large document whose shards are created in parallel and
+    written in order as they arrive
+    :param job: the shards are slices of the random stream of its seed, so the shapes
+        are the same as with write_document, whatever the shard size and worker count
+    :param pool: creates the shards, they are created in this process if None
+    :param processes: workers of the pool
+    :param shard_size: shapes per shard, write_chunks rechunks them so that culling,
+        level of detail and compact output don't depend on it
+    :return: number of shapes culled
+    """
+    def shards() -> Iterator[tuple]:
+        """
+        create the shards in order, on the pool if any
+        :return: see _run_shard
+        """
+        bounds: list = [(first, min(first + shard_size, job.num_shapes)) for first in range(0, job.num_shapes, shard_size)]
+        if pool is None:
+            for first, last in bounds:
+                yield _run_shard(job.canvas, job.seed, first, last)
+            return
+        # only a few shards are in flight, so memory doesn't grow with num_shapes
+        pending: deque = deque()
+        for first, last in bounds:
+            pending.append(pool.submit(_run_shard, job.canvas, job.seed, first, last))
+            if len(pending) > 2 * processes:
+                yield pending.popleft().result()
+        for future in pending:
+            yield future.result()
+
+    batch: Batch = Batch(job.canvas, job.num_shapes, job.seed)
+    return write_chunks(job, document_chunks(job, batch, lambda: _merge_profiles(shards())))
+
+
+class DocCache:
+    """finished documents on disk, addressed by a hash of everything their content depends on"""
+    VERSION: int = 1  # part of every key, bump it when the same job would generate different content
+    MAX_BYTES: int = 1 << 30  # size of the cache, the least recently used documents are evicted beyond it
+    TEMP_PREFIX: str = ".tmp-"  # entries being written or evicted, not part of the cache
+
+    def __init__(self, directory: str, max_bytes: int = MAX_BYTES) -> None:
+        """
+        open a cache directory, created if needed, shared by any number of processes
+        :param directory:
+        :param max_bytes:
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @staticmethod
+    def key(job: DocJob) -> Optional[str]:
+        """
+        hash everything the document and png image of a job depend on, but not their file names
+        :param job:
+        :return: None for jobs that read their shapes from a spec file
+        """
+        if job.specs:
+            return None
+        fields: dict = dict(
+            version=DocCache.VERSION,
+            canvas=list(job.canvas),
+            num_shapes=job.num_shapes,
+            art_config=vars(Batch(job.canvas, job.num_shapes, job.seed).art_config),
+            seed=job.seed,
+            title=job.title,
+            svg=job.file_name.endswith(SvgDoc.SUFFIXES),
+            gzip=job.file_name.endswith(HtmlDoc.GZIP_SUFFIXES),
+            cull=job.cull,
+            compact=job.compact,
+            png_scale=job.png_scale,
+            lod=job.lod,
+            # culling, level of detail and css classes look within a chunk of shapes, the
+            # documents are rechunked to this size whatever their shard size
+            chunk_size=ShapeColumns.CHUNK_SIZE,
+        )
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def fetch(self, job: DocJob) -> Optional[CullStats]:
+        """
+        copy the cached document of a job, and its png image, to their file names
+        :param job:
+        :return: the CullStats of the document, None if it is not cached
+        """
+        key: Optional[str] = self.key(job)
+        if key is None:
+            return None
+        entry: str = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, "stats.json")) as fd:
+                stats: CullStats = CullStats(*json.load(fd))
+            shutil.copyfile(os.path.join(entry, "document"), job.file_name)
+            if job.png_scale:
+                shutil.copyfile(os.path.join(entry, "image.png"), png_file_name(job))
+            # the modification time of an entry orders the eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            # not cached, or evicted by another process meanwhile
+            self.misses += 1
+            return None
+        self.hits += 1
+        return stats
+
+    def store(self, job: DocJob, stats: CullStats) -> None:
+        """
+        add the document of a job, just written, to the cache. The entry is
+        written in a temporary directory and renamed, so that other processes
+        never see it half written.
+        :param job:
+        :param stats: see write_document
+        :return:
+        """
+        key: Optional[str] = self.key(job)
+        if key is None or os.path.exists(os.path.join(self.directory, key)):
+            return
+        temp: str = tempfile.mkdtemp(prefix=DocCache.TEMP_PREFIX, dir=self.directory)
+        shutil.copyfile(job.file_name, os.path.join(temp, "document"))
+        if job.png_scale:
+            shutil.copyfile(png_file_name(job), os.path.join(temp, "image.png"))
+        with open(os.path.join(temp, "stats.json"), "w") as fd:
+            json.dump(list(stats), fd)
+        try:
+            os.rename(temp, os.path.join(self.directory, key))
+        except OSError:
+            # another process stored the same document first
+            shutil.rmtree(temp, ignore_errors=True)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        remove the least recently used entries until the cache fits in max_bytes
+        :return:
+        """
+        entries: list = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(DocCache.TEMP_PREFIX):
+                continue
+            try:
+                size: int = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except FileNotFoundError:
+                continue
+        total: int = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # move the entry out of the way first, so that it disappears at once
+            temp: str = os.path.join(self.directory, DocCache.TEMP_PREFIX + os.path.basename(path))
+            try:
+                os.rename(path, temp)
+            except OSError:
+                continue
+            shutil.rmtree(temp, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+
+def generate_documents(
+    jobs: list,
+    processes: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    cache: Optional[DocCache] = None,
+) -> Throughput:
+    """
+    generate documents on a pool of worker processes, each document from its
+    own random stream, so the output doesn't depend on the number of workers
+    or on the shard size
+    :param jobs: DocJob of every document, see make_jobs
+    :param processes: defaults to the number of CPUs, 1 runs in this process
+    :param shard_size: also split every document into shards of this many
+        shapes created in parallel, documents are then written one at a time
+    :param cache: copy the documents found in this cache instead of generating
+        them, and add the generated ones
+    :return:
+    """
+    start: float = time.perf_counter()
+    processes = processes or os.cpu_count()
+    # the documents to generate, and the stats of the cached ones
+    pending: list = jobs
+    stats: list = []
+    if cache is not None:
+        fetched: list = [cache.fetch(job) for job in jobs]
+        pending = [job for job, hit in zip(jobs, fetched) if hit is None]
+        stats = [hit for hit in fetched if hit is not None]
+    with ExitStack() as stack:
+        pool: Optional[ProcessPoolExecutor] = None
+        pool_map = map
+        if processes > 1:
+            pool = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(PROFILER.enabled,))
+            pool_map = stack.enter_context(pool).map
+        if shard_size:
+            generated: list = [write_sharded_document(job, pool, processes, shard_size) for job in pending]
+        else:
+            generated = list(_merge_profiles(pool_map(_run_document, pending)))
+    if cache is not None:
+        for job, job_stats in zip(pending, generated):
+            cache.store(job, job_stats)
+    _, outside, hidden, rasterized, images = map(sum, zip(CullStats(0, 0, 0), *stats, *generated))
+    shapes: int = sum(job.num_shapes for job in jobs)
+    return Throughput(len(jobs), shapes, time.perf_counter() - start, outside, hidden, rasterized, images)
+
+
+def make_jobs(
+    num_docs: int,
+    num_shapes: int,
+    seed: int,
+    canvas: Canvas = Canvas(800, 500),
+    file_name: str = "a2-3{}.html",
+    title: str = "MyPart{}",
+    cull: str = 'none',
+    compact: bool = False,
+    png_scale: Optional[float] = None,
+    lod: Optional[LevelOfDetail] = None,
+    specs: Optional[str] = None,
+) -> list:
+    """
+    describe documents numbered from 1, with random streams derived from one master seed
+    :param num_docs:
+    :param num_shapes: shapes per document
+    :param seed: master seed
+    :param canvas:
+    :param file_name: formatted with the document number
+    :param title: formatted with the document number
+    :param cull: see SvgCanvas.gen_art
+    :param compact: write compact svg
+    :param png_scale: also render every document as a png image at this scale
+    :param lod: see SvgCanvas.gen_art
+    :param specs: spec file of the shapes, formatted with the document number
+    :return:
+    """
+    return [
+        DocJob(file_name.format(i), title.format(i), canvas, num_shapes, stream_seed(seed, i), cull, compact, png_scale, lod,
+               specs.format(i) if specs else None)
+        for i in range(1, num_docs + 1)
+    ]
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description='Generate random svg art documents.')
+    parser.add_argument('--documents', type=int, default=3)
+    parser.add_argument('--shapes', type=int, default=2000, help='shapes per document')
+    parser.add_argument('--seed', type=int, help='master seed, random if omitted')
+    parser.add_argument('--processes', type=int, help='worker processes, defaults to the number of CPUs')
+    parser.add_argument('--shard-size', type=int, help='split every document into shards of this many shapes')
+    parser.add_argument('--name', default="a2-3{}.html", help='file name formatted with the document number, '
+                        'ending with .gz to compress, .svg or .svgz for standalone svg')
+    parser.add_argument('--cull', choices=CULL_MODES, default='none',
+                        help='drop shapes outside the canvas, or also the hidden ones')
+    parser.add_argument('--compact', action='store_true',
+                        help='write smaller svg, with css classes for repeated fills and no indentation')
+    parser.add_argument('--png', type=float, metavar='SCALE',
+                        help='also render every document as a png image at this scale, e.g. 0.25 for thumbnails')
+    parser.add_argument('--lod', type=int, nargs='?', const=LevelOfDetail().tile, metavar='TILE',
+                        help='draw small or crowded shapes in raster images of tiles of this size')
+    parser.add_argument('--specs', metavar='NAME',
+                        help='binary spec file of every document, formatted with the document number: the shapes '
+                             'are read from it when it exists, and written to it when generated')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='copy documents from this cache when they were generated before, and add the new ones')
+    parser.add_argument('--cache-size', type=float, default=DocCache.MAX_BYTES / 2 ** 20, metavar='MIB',
+                        help='evict the least recently used documents beyond this size')
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE',
+                        help=f'print the time of every stage, and write a json trace to TRACE if given; '
+                             f'also enabled by the {Profiler.ENV} environment variable')
+    args = parser.parse_args(argv)
+    if args.profile is not None:
+        PROFILER.enabled = True
+
+    seed: int = np.random.SeedSequence().entropy if args.seed is None else args.seed
+    jobs: list = make_jobs(args.documents, args.shapes, seed, file_name=args.name, cull=args.cull,
+                            compact=args.compact, png_scale=args.png,
+                            lod=LevelOfDetail(args.lod) if args.lod else None, specs=args.specs)
+    cache: Optional[DocCache] = DocCache(args.cache, int(args.cache_size * 2 ** 20)) if args.cache else None
+    tp: Throughput = generate_documents(jobs, args.processes, args.shard_size, cache)
+    print(f"seed {seed}: {tp.documents} documents, {tp.shapes} shapes in {tp.seconds:.2f} s "
+          f"({tp.documents / tp.seconds:.1f} documents/s, {tp.shapes / tp.seconds:.0f} shapes/s)")
+    if args.cull != 'none':
+        print(f"culled {tp.outside} shapes outside the canvas and {tp.hidden} hidden shapes")
+    if args.lod:
+        print(f"rasterized {tp.rasterized} shapes in {tp.images} images")
+    if cache is not None:
+        print(f"cache: {cache.hits} hits, {cache.misses} misses, {cache.evictions} evicted")
+    if PROFILER.enabled:
+        print(PROFILER.summary())
+    if args.profile:
+        PROFILER.write_trace(args.profile)
+
 
 if __name__ == "__main__":
     print(__doc__)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Benchmarks for the stages of the a23 svg generation pipeline"""
+import os
+import sys
+import tempfile
+from typing import Optional
+
+import a23
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import bench
+
+BASELINE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_a23_baseline.json')
+SIZES: list = [10 ** k for k in range(3, 8)]
+# make_jobs options of every configuration
+CONFIGS: dict = {
+    'plain': dict(),
+    'compact': dict(compact=True),
+    'occlusion': dict(cull='occlusion'),
+    'lod': dict(compact=True, lod=a23.LevelOfDetail()),
+}
+# slowdowns smaller than this are timer noise, not regressions
+MIN_DELTA: float = 1e-2
+
+
+def measure(config: str, n: int, repeat: int, directory: str) -> dict:
+    """
+    Generate one document, best of `repeat` runs for every stage.
+    :param config:
+    :param n: number of shapes
+    :param repeat:
+    :param directory: where the document is written
+    :return: stage -> (seconds, calls, shapes, bytes)
+    """
+    best = {}
+    for _ in range(repeat):
+        a23.PROFILER.take()
+        job = a23.make_jobs(1, n, 0, file_name=os.path.join(directory, 'bench{}.html'), **CONFIGS[config])[0]
+        a23.write_document(job)
+        for stage, (calls, seconds, shapes, nbytes) in a23.PROFILER.take()['stages'].items():
+            if stage not in best or seconds < best[stage][0]:
+                best[stage] = (seconds, calls, shapes, nbytes)
+    return best
+
+
+def run(sizes: list, configs: list, repeat: int, only: Optional[list] = None) -> list:
+    """
+    Run every configuration for every number of shapes.
+    :param sizes:
+    :param configs: names in CONFIGS
+    :param repeat:
+    :param only: stage names to report, all when None
+    :return:
+    """
+    a23.PROFILER.enabled = True
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            for config in configs:
+                for stage, (seconds, calls, shapes, nbytes) in measure(config, n, repeat, directory).items():
+                    if only and stage not in only:
+                        continue
+                    results.append(dict(
+                        stage=stage, config=config, n=n,
+                        seconds=seconds, calls=calls, shapes=shapes, bytes=nbytes,
+                    ))
+                    print(f'{stage:>10} {config:>10} n={n:<9} {seconds * 1e3:10.3f} ms', file=sys.stderr)
+    return results
+
+
+def _key(result: dict) -> tuple:
+    return result['stage'], result['config'], result['n']
+
+
+COLUMNS: list = [
+    ('stage', 10, lambda r: r['stage']),
+    ('config', 10, lambda r: r['config']),
+    ('n', 9, lambda r: r['n']),
+    ('time ms', 10, lambda r: f"{r['seconds'] * 1e3:.3f}"),
+    ('shapes/s', 11, lambda r: f"{r['shapes'] / r['seconds']:.0f}" if r['shapes'] and r['seconds'] else '-'),
+    ('MiB', 8, lambda r: f"{r['bytes'] / 2 ** 20:.2f}"),
+]
+
+
+def _add_arguments(parser) -> None:
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of shapes')
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument('--stages', nargs='+', help='only report these stages')
+
+
+def main(argv: Optional[list] = None) -> int:
+    return bench.main(
+        argv, __doc__, BASELINE, _add_arguments,
+        lambda args: run(args.sizes, args.configs, args.repeat, args.stages),
+        _key, COLUMNS, MIN_DELTA,
+    )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Baseline comparison and reporting shared by the benchmark scripts"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from typing import Callable, Optional
+
+
+def compare(results: list, baseline: list, key: Callable, tolerance: float, min_delta: float) -> list:
+    """
+    Add the baseline time and ratio to every result found in the baseline.
+    :param results:
+    :param baseline:
+    :param key: maps a result to what identifies it in the baseline
+    :param tolerance: a result slower than baseline * (1 + tolerance) regressed,
+        unless it is less than min_delta slower
+    :param min_delta: seconds of timer noise
+    :return: the regressed results
+    """
+    reference = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get(key(result))
+        if base is None:
+            continue
+        result['baseline_seconds'] = base['seconds']
+        result['ratio'] = result['seconds'] / base['seconds']
+        if result['ratio'] > 1 + tolerance and result['seconds'] - base['seconds'] > min_delta:
+            regressions.append(result)
+    return regressions
+
+
+def summary(results: list, columns: list) -> str:
+    """
+    Format the results as a table, with their ratio to the baseline last.
+    :param results:
+    :param columns: (header, width, format) of every column, format maps a result to its text
+    :return:
+    """
+    columns = columns + [('vs base', 8, lambda r: f"{r['ratio']:.2f}x" if 'ratio' in r else '-')]
+    header = ' '.join(f'{name:>{width}}' for name, width, _ in columns)
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(' '.join(f'{fmt(r):>{width}}' for _, width, fmt in columns))
+    return '\n'.join(lines)
+
+
+def main(
+    argv: Optional[list],
+    description: str,
+    baseline: str,
+    add_arguments: Callable,
+    run: Callable,
+    key: Callable,
+    columns: list,
+    min_delta: float,
+) -> int:
+    """
+    Parse the common options, run a benchmark, compare it with the stored
+    baseline and report it.
+    :param argv:
+    :param description:
+    :param baseline: default path of the stored baseline
+    :param add_arguments: adds the options of the benchmark to the parser
+    :param run: maps the parsed options to the results
+    :param key: see compare
+    :param columns: see summary
+    :param min_delta: see compare
+    :return: the exit code, 1 when a result regressed
+    """
+    parser = argparse.ArgumentParser(description=description)
+    add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write the results as JSON to this file, - for stdout')
+    parser.add_argument('--baseline', default=baseline)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f'warning: no baseline at {args.baseline}, nothing can be reported as a regression; '
+              f'record one first with --save-baseline', file=sys.stderr)
+    results = run(args)
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], key, args.tolerance, min_delta)
+
+    print(summary(results, columns))
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) over {args.tolerance:.0%}:')
+        print(summary(regressions, columns))
+
+    report = dict(numpy=np.__version__, python=sys.version.split()[0], results=results)
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=1)
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+    return 1 if regressions else 0